@@ -48,6 +48,7 @@ import models.pdg
 import models.report
 import models.api_key
 import models.webhook
+import models.file_scan_state
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -20,4 +20,61 @@ NORMALIZATION_SERVICE_URL = os.environ.get('NORMALIZATION_SERVICE_URL', 'http://
 PDG_GENERATOR_SERVICE_URL = os.environ.get('PDG_GENERATOR_SERVICE_URL', 'http://pdg-generator:5002')
 IMAGE_GENERATOR_SERVICE_URL = os.environ.get('IMAGE_GENERATOR_SERVICE_URL', 'http://image-generator:5003')
 PREDICTION_SERVICE_URL = os.environ.get('PREDICTION_SERVICE_URL', 'http://prediction:5004')
-RESULTS_SERVICE_URL = os.environ.get('RESULTS_SERVICE_URL', 'http://results:5005')
\ No newline at end of file
+RESULTS_SERVICE_URL = os.environ.get('RESULTS_SERVICE_URL', 'http://results:5005')
+
+# Pipeline Config
+# 'json' lets the image service build adjacency arrays without parsing DOT
+PDG_FORMAT = os.environ.get('PDG_FORMAT', 'dot')
+
+# Number of images sent to the prediction service per /predict/batch call
+PREDICTION_BATCH_SIZE = int(os.environ.get('PREDICTION_BATCH_SIZE', 64))
+
+# Number of files per process_file_chunk task; chunks of a scan run in parallel
+SCAN_CHUNK_SIZE = int(os.environ.get('SCAN_CHUNK_SIZE', 16))
+
+# Scan pipeline: worker threads per stage within a chunk task, capacity of
+# the queue in front of each stage, and how long the prediction stage waits
+# to fill a batch of PREDICTION_BATCH_SIZE
+PIPELINE_NORMALIZE_CONCURRENCY = int(os.environ.get('PIPELINE_NORMALIZE_CONCURRENCY', 2))
+PIPELINE_PDG_CONCURRENCY = int(os.environ.get('PIPELINE_PDG_CONCURRENCY', 2))
+PIPELINE_IMAGE_CONCURRENCY = int(os.environ.get('PIPELINE_IMAGE_CONCURRENCY', 2))
+PIPELINE_PREDICT_CONCURRENCY = int(os.environ.get('PIPELINE_PREDICT_CONCURRENCY', 1))
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', 4))
+PIPELINE_BATCH_TIMEOUT = float(os.environ.get('PIPELINE_BATCH_TIMEOUT', 0.5))
+
+# Inter-service HTTP calls: kept-alive connections per service, retries with
+# exponential backoff, connect timeout and per-stage read timeouts (seconds)
+SERVICE_POOL_SIZE = int(os.environ.get('SERVICE_POOL_SIZE', 10))
+SERVICE_RETRIES = int(os.environ.get('SERVICE_RETRIES', 3))
+SERVICE_RETRY_BACKOFF = float(os.environ.get('SERVICE_RETRY_BACKOFF', 0.5))
+SERVICE_CONNECT_TIMEOUT = float(os.environ.get('SERVICE_CONNECT_TIMEOUT', 5))
+NORMALIZATION_TIMEOUT = float(os.environ.get('NORMALIZATION_TIMEOUT', 60))
+PDG_GENERATION_TIMEOUT = float(os.environ.get('PDG_GENERATION_TIMEOUT', 600))
+IMAGE_GENERATION_TIMEOUT = float(os.environ.get('IMAGE_GENERATION_TIMEOUT', 120))
+PREDICTION_TIMEOUT = float(os.environ.get('PREDICTION_TIMEOUT', 120))
+
+# Seconds before Redis redelivers an unacknowledged task; must exceed the
+# longest chunk task, or the chunk runs twice
+CELERY_VISIBILITY_TIMEOUT = int(os.environ.get('CELERY_VISIBILITY_TIMEOUT', 6 * 3600))
+
+# Seconds between checks of a running scan's status for cancellation
+SCAN_CANCEL_CHECK_INTERVAL = float(os.environ.get('SCAN_CANCEL_CHECK_INTERVAL', 1))
+
+# How pipeline artifacts reach the services: 'upload' sends each file in the
+# request body, 'reference' sends only its path on the shared data volume
+# (which every service must mount at the same path as the worker)
+ARTIFACT_TRANSFER_MODE = os.environ.get('ARTIFACT_TRANSFER_MODE', 'upload')
+
+# Scan scheduling: submitted scans wait in a Redis backlog; at most
+# SCAN_MAX_RUNNING run at once, SCAN_MAX_RUNNING_PER_USER per user, and users
+# take turns within each priority level. ETAs assume
+# SCAN_DEFAULT_SECONDS_PER_FILE until a scan has completed
+SCAN_SCHEDULER_REDIS_URL = os.environ.get('SCAN_SCHEDULER_REDIS_URL', os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0'))
+SCAN_MAX_RUNNING = int(os.environ.get('SCAN_MAX_RUNNING', 4))
+SCAN_MAX_RUNNING_PER_USER = int(os.environ.get('SCAN_MAX_RUNNING_PER_USER', 2))
+SCAN_DEFAULT_SECONDS_PER_FILE = float(os.environ.get('SCAN_DEFAULT_SECONDS_PER_FILE', 10))
+
+# A scan's chunk tasks drop one Celery priority step every
+# SCAN_CHUNKS_PER_PRIORITY_STEP chunks, so the first chunks of a newly
+# started scan run ahead of the remaining chunks of a long one
+SCAN_CHUNKS_PER_PRIORITY_STEP = int(os.environ.get('SCAN_CHUNKS_PER_PRIORITY_STEP', 4))
\ No newline at end of file
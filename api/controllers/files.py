@@ -6,6 +6,7 @@ from werkzeug.utils import secure_filename
 from app import db
 from models.file import File
 from models.project import Project
+from services.file_service import file_sha256
 
 files_bp = Blueprint('files', __name__)
 
@@ -125,7 +126,8 @@ def upload_file(project_id):
         filename=filename,
         file_path=file_path,
         content_type=file.content_type,
-        file_size=os.path.getsize(file_path)
+        file_size=os.path.getsize(file_path),
+        content_hash=file_sha256(file_path)
     )
     
     db.session.add(file_record)
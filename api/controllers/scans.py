@@ -13,7 +13,11 @@ from models.file import File
 from models.pdg import PDG
 from models.report import Report
 from models.vulnerability import Vulnerability
-from services.scan_service import process_scan
+from models.file_scan_state import FileScanState
+from services.file_service import file_sha256
+from services.scan_service import submit_scan, ensure_file_states, cancel_scan_work, scan_queue_status
+from utils.validation import ScanOptionsSchema
+from marshmallow import EXCLUDE
 
 scans_bp = Blueprint('scans', __name__)
 
@@ -68,6 +72,17 @@ def get_scan(scan_id):
     
     scan_data['files'] = [file.to_dict() for file in files]
     
+    # Number of files at each stage
+    scan_data['file_stages'] = dict(
+        db.session.query(FileScanState.stage, db.func.count(FileScanState.id))
+        .filter(FileScanState.scan_id == scan_id)
+        .group_by(FileScanState.stage)
+        .all()
+    )
+    
+    # Position in the scan queue and estimated start/completion, while queued or running
+    scan_data['queue'] = scan_queue_status(scan_id)
+    
     return jsonify(scan_data), 200
 
 @scans_bp.route('', methods=['POST'])
@@ -106,6 +121,16 @@ def create_scan():
         except:
             pass
     
+    # Incremental scans only process files changed since the project's last completed scan
+    if request.form.get('incremental', '').lower() in ('1', 'true', 'yes'):
+        scan_options['incremental'] = True
+    
+    if not isinstance(scan_options, dict):
+        return jsonify({'message': 'Invalid scan options'}), 400
+    errors = ScanOptionsSchema(unknown=EXCLUDE).validate(scan_options)
+    if errors:
+        return jsonify({'message': 'Invalid scan options', 'errors': errors}), 400
+    
     # Create scan record
     scan_id = str(uuid.uuid4())
     new_scan = Scan(
@@ -141,7 +166,8 @@ def create_scan():
             filename=filename,
             file_path=file_path,
             content_type=file.content_type,
-            file_size=os.path.getsize(file_path)
+            file_size=os.path.getsize(file_path),
+            content_hash=file_sha256(file_path)
         )
         
         db.session.add(file_record)
@@ -149,13 +175,17 @@ def create_scan():
     
     db.session.commit()
     
-    # Start scan processing in background
-    process_scan.delay(scan_id, [f.id for f in uploaded_files])
+    # Per-file stage checkpoints, so the scan can be resumed
+    ensure_file_states(scan_id, [f.id for f in uploaded_files])
+    
+    # Queue the scan; it starts once the scheduler gives it a slot
+    submit_scan(new_scan, len(uploaded_files))
     
     return jsonify({
-        'message': 'Scan created and processing started',
+        'message': 'Scan created and queued for processing',
         'scan': new_scan.to_dict(),
-        'files': [file.to_dict() for file in uploaded_files]
+        'files': [file.to_dict() for file in uploaded_files],
+        'queue': scan_queue_status(scan_id)
     }), 201
 
 @scans_bp.route('/<scan_id>/cancel', methods=['POST'])
@@ -175,11 +205,55 @@ def cancel_scan(scan_id):
     scan.completed_at = datetime.utcnow()
     db.session.commit()
     
+    # Stop queued and running work instead of letting it finish
+    cancel_scan_work(scan)
+    
     return jsonify({
         'message': 'Scan cancelled successfully',
         'scan': scan.to_dict()
     }), 200
 
+@scans_bp.route('/<scan_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_scan(scan_id):
+    current_user_id = get_jwt_identity()
+    
+    scan = Scan.query.filter_by(id=scan_id, user_id=current_user_id).first()
+    
+    if not scan:
+        return jsonify({'message': 'Scan not found'}), 404
+    
+    # A processing scan may still have live workers; resuming it runs
+    # them twice, so it needs force (e.g. after a worker crash)
+    force = bool((request.get_json(silent=True) or {}).get('force'))
+    if scan.status == 'completed' or (scan.status == 'processing' and not force):
+        return jsonify({'message': f'Scan cannot be resumed while {scan.status}'}), 400
+    
+    remaining = [
+        state.file_id for state in FileScanState.query.filter_by(scan_id=scan_id).all()
+        if state.stage != 'predicted'
+    ]
+    
+    # Clearing the run makes the old run's tasks stop and discard their
+    # results; dispatch starts a new run
+    scan.status = 'pending'
+    scan.completed_at = None
+    scan.run_id = None
+    db.session.commit()
+    
+    # Queued again like a new scan; a forced resume first revokes the old
+    # run's tasks and gives up its slot
+    if force:
+        cancel_scan_work(scan)
+    submit_scan(scan, len(remaining))
+    
+    return jsonify({
+        'message': 'Scan resumed',
+        'scan': scan.to_dict(),
+        'remaining_files': len(remaining),
+        'queue': scan_queue_status(scan_id)
+    }), 202
+
 @scans_bp.route('/<scan_id>/results', methods=['GET'])
 @jwt_required()
 def get_scan_results(scan_id):
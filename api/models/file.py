@@ -12,18 +12,20 @@ class File(db.Model):
     file_size = db.Column(db.Integer, nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(50), default='uploaded')
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the contents
 
     # Relationships
     vulnerabilities = db.relationship('Vulnerability', backref='file', lazy=True)
     pdgs = db.relationship('PDG', backref='file', lazy=True)
 
-    def __init__(self, id, project_id, filename, file_path, content_type, file_size):
+    def __init__(self, id, project_id, filename, file_path, content_type, file_size, content_hash=None):
         self.id = id
         self.project_id = project_id
         self.filename = filename
         self.file_path = file_path
         self.content_type = content_type
         self.file_size = file_size
+        self.content_hash = content_hash
 
     def to_dict(self):
         return {
@@ -34,5 +36,6 @@ class File(db.Model):
             'content_type': self.content_type,
             'file_size': self.file_size,
             'uploaded_at': self.uploaded_at.isoformat(),
-            'status': self.status
+            'status': self.status,
+            'content_hash': self.content_hash
         }
\ No newline at end of file
@@ -0,0 +1,41 @@
+from app import db
+from datetime import datetime
+
+# Stages a file goes through in a scan, in order
+FILE_SCAN_STAGES = ('pending', 'normalized', 'pdg', 'image', 'predicted')
+
+class FileScanState(db.Model):
+    __tablename__ = 'scan_file_states'
+    __table_args__ = (db.UniqueConstraint('scan_id', 'file_id'),)
+
+    id = db.Column(db.String(36), primary_key=True)
+    scan_id = db.Column(db.String(36), db.ForeignKey('scans.id'), nullable=False, index=True)
+    file_id = db.Column(db.String(36), db.ForeignKey('files.id'), nullable=False)
+    stage = db.Column(db.String(50), default='pending')  # last completed stage
+    normalized_path = db.Column(db.String(512))
+    normalized_hash = db.Column(db.String(64))
+    pdg_path = db.Column(db.String(512))
+    pdg_hash = db.Column(db.String(64))
+    image_path = db.Column(db.String(512))
+    image_hash = db.Column(db.String(64))
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, id, scan_id, file_id, stage='pending'):
+        self.id = id
+        self.scan_id = scan_id
+        self.file_id = file_id
+        self.stage = stage
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'scan_id': self.scan_id,
+            'file_id': self.file_id,
+            'stage': self.stage,
+            'normalized_path': self.normalized_path,
+            'pdg_path': self.pdg_path,
+            'image_path': self.image_path,
+            'error': self.error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
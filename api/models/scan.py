@@ -2,6 +2,10 @@ from app import db
 from datetime import datetime
 import json
 
+# Scan priorities, highest first
+SCAN_PRIORITIES = ('high', 'normal', 'low')
+DEFAULT_SCAN_PRIORITY = 'normal'
+
 class Scan(db.Model):
     __tablename__ = 'scans'
 
@@ -16,6 +20,11 @@ class Scan(db.Model):
     high_severity_count = db.Column(db.Integer, default=0)
     medium_severity_count = db.Column(db.Integer, default=0)
     low_severity_count = db.Column(db.Integer, default=0)
+    task_ids = db.Column(db.Text)  # JSON array of Celery task IDs, revoked on cancel
+    run_id = db.Column(db.String(36))  # current processing run; tasks of earlier runs stop and save nothing
+    unique_files_count = db.Column(db.Integer)  # distinct file contents processed
+    duplicate_files_count = db.Column(db.Integer)  # files given the results of an identical one
+    reused_files_count = db.Column(db.Integer)  # incremental scans: files unchanged since the last scan
 
     # Relationships
     vulnerabilities = db.relationship('Vulnerability', backref='scan', lazy=True)
@@ -37,6 +46,24 @@ class Scan(db.Model):
     def set_scan_options(self, options):
         self.scan_options = json.dumps(options)
 
+    def get_priority(self):
+        return self.get_scan_options().get('priority', DEFAULT_SCAN_PRIORITY)
+
+    def get_task_ids(self):
+        if self.task_ids:
+            return json.loads(self.task_ids)
+        return []
+
+    def add_task_ids(self, task_ids):
+        self.task_ids = json.dumps(self.get_task_ids() + list(task_ids))
+
+    def get_dedup_ratio(self):
+        """Fraction of the scan's files that were duplicates, or None before planning"""
+        if self.unique_files_count is None:
+            return None
+        total = self.unique_files_count + (self.duplicate_files_count or 0)
+        return (self.duplicate_files_count or 0) / total if total else 0.0
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -49,5 +76,9 @@ class Scan(db.Model):
             'vulnerabilities_count': self.vulnerabilities_count,
             'high_severity_count': self.high_severity_count,
             'medium_severity_count': self.medium_severity_count,
-            'low_severity_count': self.low_severity_count
+            'low_severity_count': self.low_severity_count,
+            'unique_files_count': self.unique_files_count,
+            'duplicate_files_count': self.duplicate_files_count,
+            'dedup_ratio': self.get_dedup_ratio(),
+            'reused_files_count': self.reused_files_count
         }
\ No newline at end of file
@@ -0,0 +1,17 @@
+import hashlib
+
+def file_sha256(file_path):
+    """
+    SHA-256 of a file's contents
+    
+    Args:
+        file_path (str): Path to the file
+        
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,206 @@
+import queue
+import threading
+import time
+
+# Marks the end of a stage's input
+_DONE = object()
+
+class Stage:
+    """
+    One step of a StagePipeline
+
+    fn takes an item and returns the item for the next stage, or None to
+    drop it. With batch_size set, fn takes a list of up to batch_size items
+    (collected for at most batch_timeout seconds) and returns a list of the
+    same length, or None to drop the whole batch.
+    """
+
+    def __init__(self, name, fn, concurrency=1, batch_size=None, batch_timeout=0.5):
+        """
+        Args:
+            name (str): Stage name used in metrics
+            fn: Stage function
+            concurrency (int): Number of worker threads running fn
+            batch_size (int): Batch the stage's input (None for one item at a time)
+            batch_timeout (float): Maximum seconds to wait for a batch to fill
+        """
+        self.name = name
+        self.fn = fn
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+
+class StagePipeline:
+    """
+    Runs items through a sequence of stages with overlapping execution
+
+    Each stage has its own worker threads and a bounded input queue, so item
+    N+1 can be in the first stage while item N is in the second; when a
+    stage falls behind, the queue in front of it fills up and the stages
+    before it block instead of buffering without limit.
+    """
+
+    def __init__(self, stages, queue_size=4, should_stop=None):
+        """
+        Args:
+            stages (list): Stage objects, in order
+            queue_size (int): Capacity of each stage's input queue
+            should_stop: Optional function checked before each item or batch;
+                         once it returns True the pipeline stops early
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.should_stop = should_stop
+        self.stopped = False
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._remaining_workers = [stage.concurrency for stage in stages]
+        self._metrics = [
+            {'processed': 0, 'dropped': 0, 'errors': 0, 'busy_seconds': 0.0, 'max_queue_depth': 0}
+            for _ in stages
+        ]
+        self._started_at = None
+        self._finished_at = None
+
+    def run(self, items):
+        """
+        Feed items through the pipeline
+
+        Args:
+            items: Iterable of inputs to the first stage
+
+        Yields:
+            Outputs of the last stage, in completion order
+        """
+        self._started_at = time.perf_counter()
+        threads = [threading.Thread(target=self._feed, args=(items,), name='pipeline-feed', daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for i in range(stage.concurrency):
+                threads.append(threading.Thread(
+                    target=self._work, args=(index,), name=f'pipeline-{stage.name}-{i}', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = self._queues[-1].get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # Unblock the workers if the caller stops early
+            self._stop.set()
+            self._finished_at = time.perf_counter()
+
+    def stop(self):
+        """Stop early: workers finish their current item and nothing new starts"""
+        self.stopped = True
+        self._stop.set()
+        self._queues[-1].put(_DONE)
+
+    def _put(self, index, item):
+        """Put into a queue, giving up if the pipeline is stopped"""
+        while not self._stop.is_set():
+            try:
+                self._queues[index].put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, index, timeout=None):
+        """Get from a queue, returning _DONE if the pipeline is stopped"""
+        deadline = time.perf_counter() + timeout if timeout is not None else None
+        while not self._stop.is_set():
+            wait = 0.1 if deadline is None else min(0.1, deadline - time.perf_counter())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                item = self._queues[index].get(timeout=wait)
+            except queue.Empty:
+                continue
+            with self._lock:
+                metrics = self._metrics[index]
+                metrics['max_queue_depth'] = max(metrics['max_queue_depth'], self._queues[index].qsize() + 1)
+            return item
+        return _DONE
+
+    def _feed(self, items):
+        for item in items:
+            if not self._put(0, item):
+                return
+        self._put(0, _DONE)
+
+    def _work(self, index):
+        stage = self.stages[index]
+        metrics = self._metrics[index]
+        done = False
+        while not done:
+            item = self._get(index)
+            if item is _DONE:
+                break
+            if self.should_stop is not None and self.should_stop():
+                self.stop()
+                return
+
+            batch = [item]
+            if stage.batch_size:
+                deadline = time.perf_counter() + stage.batch_timeout
+                while len(batch) < stage.batch_size:
+                    try:
+                        item = self._get(index, max(0.0, deadline - time.perf_counter()))
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+
+            start = time.perf_counter()
+            try:
+                outputs = stage.fn(batch) if stage.batch_size else [stage.fn(batch[0])]
+            except Exception as e:
+                print(f"Error in pipeline stage {stage.name}: {str(e)}")
+                outputs = None
+                with self._lock:
+                    metrics['errors'] += len(batch)
+            elapsed = time.perf_counter() - start
+
+            outputs = outputs or [None] * len(batch)
+            with self._lock:
+                metrics['busy_seconds'] += elapsed
+                metrics['processed'] += len(batch)
+                metrics['dropped'] += sum(output is None for output in outputs)
+            for output in outputs:
+                if output is not None and not self._put(index + 1, output):
+                    return
+
+        # Let the other workers of this stage see the end of input, and
+        # pass it on once the last of them has finished
+        self._put(index, _DONE)
+        with self._lock:
+            self._remaining_workers[index] -= 1
+            last = self._remaining_workers[index] == 0
+        if last:
+            self._put(index + 1, _DONE)
+
+    def metrics(self):
+        """
+        Per-stage metrics
+
+        Returns:
+            dict: For each stage, items processed and dropped, busy time,
+                  throughput, current and maximum input queue depth
+        """
+        end = self._finished_at or time.perf_counter()
+        elapsed = end - self._started_at if self._started_at else 0.0
+        result = {'elapsed_seconds': elapsed, 'stopped': self.stopped, 'stages': {}}
+        with self._lock:
+            for index, stage in enumerate(self.stages):
+                metrics = dict(self._metrics[index])
+                metrics['concurrency'] = stage.concurrency
+                metrics['items_per_second'] = metrics['processed'] / elapsed if elapsed else 0.0
+                metrics['queue_depth'] = self._queues[index].qsize()
+                result['stages'][stage.name] = metrics
+        return result
@@ -0,0 +1,210 @@
+import json
+import time
+from collections import Counter
+from itertools import zip_longest
+from models.scan import SCAN_PRIORITIES
+
+class ScanScheduler:
+    """
+    Redis-backed admission control for scans
+
+    Submitted scans wait in a backlog per priority and user. At most
+    max_running scans run at once, and at most max_running_per_user of
+    the same user. When a slot frees up, the next scan comes from the
+    highest priority level with waiting scans, and users take turns
+    (round robin) within a level. Large scans of one user therefore never
+    hold back other users' scans for longer than one slot.
+
+    All changes happen under a Redis lock, so API processes and Celery
+    workers can share one scheduler.
+    """
+
+    def __init__(self, redis_client, max_running, max_running_per_user, default_seconds_per_file, prefix='scans:'):
+        """
+        Args:
+            redis_client: redis.Redis with decode_responses=True
+            max_running (int): Maximum scans running at once
+            max_running_per_user (int): Maximum scans of one user running at once
+            default_seconds_per_file (float): Processing time assumed for ETAs
+                                              until a scan has completed
+            prefix (str): Prefix of the scheduler's Redis keys
+        """
+        self.redis = redis_client
+        self.max_running = max_running
+        self.max_running_per_user = max_running_per_user
+        self.default_seconds_per_file = default_seconds_per_file
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(parts)
+
+    def _lock(self):
+        return self.redis.lock(self._key('lock'), timeout=30, blocking_timeout=30)
+
+    def enqueue(self, scan_id, user_id, priority, num_files):
+        """
+        Add a scan to the backlog
+
+        Args:
+            scan_id (str): The ID of the scan
+            user_id (str): Owner of the scan
+            priority (str): One of SCAN_PRIORITIES
+            num_files (int): Number of files, for ETAs
+
+        Returns:
+            bool: False if the scan was already queued or running
+        """
+        with self._lock():
+            if self.redis.hexists(self._key('queued'), scan_id) or self.redis.hexists(self._key('running'), scan_id):
+                return False
+            self.redis.hset(self._key('queued'), scan_id, json.dumps({
+                'user_id': user_id, 'priority': priority, 'files': num_files, 'queued_at': time.time()
+            }))
+            # A user is in a priority level's ring while they have scans waiting in it
+            if self.redis.rpush(self._key('backlog', priority, user_id), scan_id) == 1:
+                self.redis.rpush(self._key('users', priority), user_id)
+            return True
+
+    def remove(self, scan_id):
+        """Take a scan out of the backlog (it is not started)"""
+        with self._lock():
+            entry = self.redis.hget(self._key('queued'), scan_id)
+            if entry is None:
+                return False
+            entry = json.loads(entry)
+            backlog = self._key('backlog', entry['priority'], entry['user_id'])
+            self.redis.lrem(backlog, 0, scan_id)
+            if not self.redis.llen(backlog):
+                self.redis.lrem(self._key('users', entry['priority']), 0, entry['user_id'])
+            self.redis.hdel(self._key('queued'), scan_id)
+            return True
+
+    def dispatch(self):
+        """
+        Move scans from the backlog to running while there are free slots
+
+        Returns:
+            list: IDs of the scans to start now
+        """
+        started = []
+        with self._lock():
+            while self.redis.hlen(self._key('running')) < self.max_running:
+                scan_id = self._next_scan()
+                if scan_id is None:
+                    break
+                entry = json.loads(self.redis.hget(self._key('queued'), scan_id))
+                entry['started_at'] = time.time()
+                self.redis.hset(self._key('running'), scan_id, json.dumps(entry))
+                self.redis.hdel(self._key('queued'), scan_id)
+                started.append(scan_id)
+        return started
+
+    def _next_scan(self):
+        """Pop the next scan to run: highest priority first, users in turn (caller holds the lock)"""
+        running_by_user = Counter(json.loads(entry)['user_id'] for entry in self.redis.hvals(self._key('running')))
+        for priority in SCAN_PRIORITIES:
+            ring = self._key('users', priority)
+            for _ in range(self.redis.llen(ring)):
+                user_id = self.redis.lpop(ring)
+                if running_by_user[user_id] >= self.max_running_per_user:
+                    self.redis.rpush(ring, user_id)
+                    continue
+                backlog = self._key('backlog', priority, user_id)
+                scan_id = self.redis.lpop(backlog)
+                if self.redis.llen(backlog):
+                    # Back of the ring, behind the users who have not had a turn
+                    self.redis.rpush(ring, user_id)
+                if scan_id is not None:
+                    return scan_id
+        return None
+
+    def release(self, scan_id, completed=False):
+        """
+        Free a running scan's slot
+
+        Args:
+            scan_id (str): The ID of the scan
+            completed (bool): The scan finished normally, so its duration
+                              updates the seconds-per-file estimate
+
+        Returns:
+            bool: False if the scan was not running
+        """
+        with self._lock():
+            entry = self.redis.hget(self._key('running'), scan_id)
+            if entry is None:
+                return False
+            self.redis.hdel(self._key('running'), scan_id)
+
+            entry = json.loads(entry)
+            if completed and entry['files']:
+                # Exponential moving average over completed scans, updated
+                # under the lock so concurrent releases do not drop samples
+                sample = (time.time() - entry['started_at']) / entry['files']
+                self.redis.set(self._key('seconds_per_file'), 0.8 * self.seconds_per_file() + 0.2 * sample)
+            return True
+
+    def running(self):
+        """IDs of the running scans"""
+        return self.redis.hkeys(self._key('running'))
+
+    def seconds_per_file(self):
+        """Estimated processing time per file"""
+        value = self.redis.get(self._key('seconds_per_file'))
+        return float(value) if value is not None else self.default_seconds_per_file
+
+    def _order(self):
+        """Queued scan IDs in the order dispatch would start them, ignoring per-user limits"""
+        order = []
+        for priority in SCAN_PRIORITIES:
+            users = self.redis.lrange(self._key('users', priority), 0, -1)
+            backlogs = [self.redis.lrange(self._key('backlog', priority, user_id), 0, -1) for user_id in users]
+            for turn in zip_longest(*backlogs):
+                order.extend(scan_id for scan_id in turn if scan_id is not None)
+        return order
+
+    def status(self, scan_id):
+        """
+        Queue position and estimated times of a scan
+
+        Returns:
+            dict: state (queued or running) and estimates in seconds, or None
+                  if the scheduler does not know the scan
+        """
+        seconds_per_file = self.seconds_per_file()
+        now = time.time()
+        running = {key: json.loads(value) for key, value in self.redis.hgetall(self._key('running')).items()}
+        if scan_id in running:
+            entry = running[scan_id]
+            return {
+                'state': 'running',
+                'priority': entry['priority'],
+                'estimated_completion_seconds': max(0.0, entry['files'] * seconds_per_file - (now - entry['started_at']))
+            }
+
+        entry = self.redis.hget(self._key('queued'), scan_id)
+        if entry is None:
+            return None
+        entry = json.loads(entry)
+        order = self._order()
+        if scan_id not in order:
+            return None
+        position = order.index(scan_id)
+        # HMGET needs at least one field
+        ahead = [
+            json.loads(value) for value in self.redis.hmget(self._key('queued'), order[:position]) if value
+        ] if position else []
+        files_ahead = sum(value['files'] for value in ahead)
+
+        # Work left on the running scans plus the scans ahead, spread over the slots
+        remaining = sum(max(0.0, value['files'] * seconds_per_file - (now - value['started_at'])) for value in running.values())
+        start = (remaining + files_ahead * seconds_per_file) / max(1, self.max_running)
+        return {
+            'state': 'queued',
+            'priority': entry['priority'],
+            'position': position + 1,
+            'queue_length': len(order),
+            'files_ahead': files_ahead,
+            'estimated_start_seconds': start,
+            'estimated_completion_seconds': start + entry['files'] * seconds_per_file
+        }
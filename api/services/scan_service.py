@@ -1,124 +1,736 @@
-from app import db
-from celery import Celery
-from models.scan import Scan
+from app import app, db
+from celery import Celery, chord
+from models.scan import Scan, SCAN_PRIORITIES
 from models.file import File
 from models.vulnerability import Vulnerability
 from models.pdg import PDG
+from models.file_scan_state import FileScanState, FILE_SCAN_STAGES
 import os
+import redis
 import uuid
-import requests
 import json
+import threading
+import time
 from datetime import datetime
+from functools import partial
 import config
+from services.file_service import file_sha256
+from services.pipeline import Stage, StagePipeline
+from services.scan_scheduler import ScanScheduler
+from services.service_client import get_service_client
 
 # Initialize Celery
 celery = Celery('scan_service')
 celery.conf.broker_url = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 celery.conf.result_backend = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
 
+# Acknowledge tasks only once they finish, so a chunk whose worker dies is
+# redelivered and resumes from its files' stage checkpoints
+celery.conf.task_acks_late = True
+celery.conf.task_reject_on_worker_lost = True
+
+# Message priorities (0 highest) on Redis: one list per priority step, and
+# workers prefetch a single task so a higher priority one is taken next
+celery.conf.broker_transport_options = {
+    'visibility_timeout': config.CELERY_VISIBILITY_TIMEOUT,
+    'priority_steps': list(range(10)),
+    'queue_order_strategy': 'priority'
+}
+celery.conf.worker_prefetch_multiplier = 1
+
+# Which submitted scans run, and in what order (see ScanScheduler)
+scheduler = ScanScheduler(
+    redis.Redis.from_url(config.SCAN_SCHEDULER_REDIS_URL, decode_responses=True),
+    config.SCAN_MAX_RUNNING,
+    config.SCAN_MAX_RUNNING_PER_USER,
+    config.SCAN_DEFAULT_SECONDS_PER_FILE
+)
+
+class ContextTask(celery.Task):
+    """Run tasks inside the Flask app context, which the database session needs"""
+    
+    def __call__(self, *args, **kwargs):
+        with app.app_context():
+            return self.run(*args, **kwargs)
+
+celery.Task = ContextTask
+
 @celery.task
-def process_scan(scan_id, file_ids):
+def process_scan(scan_id, file_ids, run_id=None):
     """
     Process a scan in the background using a task queue.
     
+    With the incremental scan option, files unchanged since the project's
+    last completed scan get that scan's results instead of being processed
+    (see reuse_previous_results). Byte-identical files are processed once
+    (see plan_scan_files). The distinct files are split into chunks of
+    SCAN_CHUNK_SIZE that run as parallel process_file_chunk tasks;
+    finalize_scan runs once all of them are done.
+    
     Args:
         scan_id: The ID of the scan to process
         file_ids: List of file IDs to include in the scan
+        run_id: The run started by dispatch_scans; the tasks of a run that
+                has been replaced (forced resume) stop without effect
     """
     try:
         # Update scan status
         scan = Scan.query.get(scan_id)
         if not scan:
             return {"error": "Scan not found"}
+        if scan.status == "cancelled":
+            return {"status": "cancelled", "scan_id": scan_id}
+        if scan.run_id != run_id:
+            return {"status": "superseded", "scan_id": scan_id}
         
         scan.status = "processing"
+        
+        if scan.get_scan_options().get("incremental"):
+            file_ids = reuse_previous_results(scan, file_ids)
+        
+        unique_ids, duplicates = plan_scan_files(file_ids)
+        if scan.unique_files_count is None:
+            # Counted for the whole scan, not again for the remaining files on resume
+            scan.unique_files_count = len(unique_ids)
+            scan.duplicate_files_count = sum(len(ids) for ids in duplicates.values())
         db.session.commit()
         
-        # Process each file
-        for file_id in file_ids:
-            file = File.query.get(file_id)
-            if not file:
-                continue
-            
-            # Step 1: Normalize code
-            normalized_file_path = normalize_code(file.file_path)
-            if not normalized_file_path:
-                continue
-            
-            # Step 2: Generate PDG
-            pdg_file_path = generate_pdg(normalized_file_path)
-            if not pdg_file_path:
-                continue
-            
-            # Step 3: Generate image representation
-            image_file_path = generate_image(pdg_file_path)
-            if not image_file_path:
-                continue
-            
-            # Step 4: Run vulnerability prediction
-            vulnerabilities = predict_vulnerabilities(image_file_path, file.id)
-            if not vulnerabilities:
-                continue
-            
-            # Save PDG to database
-            with open(pdg_file_path, 'r') as f:
-                pdg_data = f.read()
-            
-            pdg_id = str(uuid.uuid4())
-            pdg = PDG(
-                id=pdg_id,
-                file_id=file.id,
-                scan_id=scan_id,
-                pdg_data=pdg_data
-            )
-            db.session.add(pdg)
-            
-            # Save vulnerabilities to database
-            for vuln in vulnerabilities:
-                vuln_id = str(uuid.uuid4())
-                vulnerability = Vulnerability(
-                    id=vuln_id,
-                    scan_id=scan_id,
-                    file_id=file.id,
-                    function_name=vuln.get('function_name'),
-                    line_number=vuln.get('line_number'),
-                    severity=vuln.get('severity'),
-                    vulnerability_type=vuln.get('type'),
-                    cwe_id=vuln.get('cwe_id'),
-                    description=vuln.get('description'),
-                    code_snippet=vuln.get('code_snippet'),
-                    recommendation=vuln.get('recommendation'),
-                    confidence_score=vuln.get('confidence_score')
-                )
-                db.session.add(vulnerability)
-                
-                # Update scan counts
-                scan.vulnerabilities_count += 1
-                if vuln.get('severity') == 'high':
-                    scan.high_severity_count += 1
-                elif vuln.get('severity') == 'medium':
-                    scan.medium_severity_count += 1
-                elif vuln.get('severity') == 'low':
-                    scan.low_severity_count += 1
+        chunks = [
+            unique_ids[i:i + config.SCAN_CHUNK_SIZE]
+            for i in range(0, len(unique_ids), config.SCAN_CHUNK_SIZE)
+        ]
+        if not chunks:
+            return finalize_scan([], scan_id, run_id)
         
-        # Update scan status
-        scan.status = "completed"
-        scan.completed_at = datetime.utcnow()
+        # Task IDs are assigned up front and stored, so cancel can revoke them
+        header = [
+            process_file_chunk.s(
+                scan_id, chunk, {file_id: duplicates[file_id] for file_id in chunk if file_id in duplicates}, run_id
+            ).set(task_id=str(uuid.uuid4()), priority=chunk_priority(scan.get_priority(), index))
+            for index, chunk in enumerate(chunks)
+        ]
+        callback = finalize_scan.s(scan_id, run_id).set(task_id=str(uuid.uuid4()))
+        callback = callback.on_error(scan_failed.s(scan_id=scan_id, run_id=run_id))
+        scan.add_task_ids([task.id for task in header] + [callback.id])
         db.session.commit()
         
-        return {"status": "success", "scan_id": scan_id}
+        chord(header)(callback)
+        
+        return {"status": "dispatched", "scan_id": scan_id, "chunks": len(chunks)}
     
     except Exception as e:
         # Log error and update scan status
         print(f"Error processing scan {scan_id}: {str(e)}")
+        mark_scan_failed(scan_id, run_id)
+        return {"error": str(e)}
+
+def ensure_content_hash(file):
+    """Hash a file uploaded before content hashing, if it still exists (the caller commits)"""
+    if file.content_hash is None and os.path.exists(file.file_path):
+        file.content_hash = file_sha256(file.file_path)
+    return file.content_hash
+
+def reuse_previous_results(scan, file_ids):
+    """
+    Give files unchanged since the project's last completed scan that scan's results
+    
+    A file is unchanged if a file predicted in the previous scan has the
+    same content hash. Its PDG and vulnerability rows are copied to the
+    new scan and its checkpoint is marked predicted, in one transaction.
+    
+    Args:
+        scan: The scan being processed
+        file_ids: IDs of the files in the scan
+        
+    Returns:
+        list: IDs of the new or modified files, which still need processing
+    """
+    previous = Scan.query.filter(
+        Scan.project_id == scan.project_id, Scan.id != scan.id, Scan.status == "completed"
+    ).order_by(Scan.completed_at.desc()).first()
+    if previous is None:
+        return file_ids
+    
+    previous_files = {}
+    for file_id, content_hash in db.session.query(File.id, File.content_hash).join(
+        FileScanState, FileScanState.file_id == File.id
+    ).filter(
+        FileScanState.scan_id == previous.id, FileScanState.stage == "predicted", File.content_hash.isnot(None)
+    ):
+        previous_files.setdefault(content_hash, file_id)
+    
+    # New file ID -> ID of the unchanged file in the previous scan
+    matches = {}
+    for file in File.query.filter(File.id.in_(file_ids)).all():
+        content_hash = ensure_content_hash(file)
+        if content_hash in previous_files:
+            matches[file.id] = previous_files[content_hash]
+    if not matches:
+        db.session.commit()
+        return file_ids
+    
+    targets = {}
+    for file_id, previous_file_id in matches.items():
+        targets.setdefault(previous_file_id, []).append(file_id)
+    
+    copies = {PDG: [], Vulnerability: []}
+    for model, rows in copies.items():
+        columns = [column.name for column in model.__table__.columns]
+        for row in model.query.filter(model.scan_id == previous.id, model.file_id.in_(list(targets))):
+            values = {column: getattr(row, column) for column in columns}
+            for file_id in targets[row.file_id]:
+                rows.append(dict(values, id=str(uuid.uuid4()), scan_id=scan.id, file_id=file_id))
+    
+    db.session.bulk_insert_mappings(PDG, copies[PDG])
+    db.session.bulk_insert_mappings(Vulnerability, copies[Vulnerability])
+    increment_scan_counts(scan.id, [row['severity'] for row in copies[Vulnerability]])
+    FileScanState.query.filter(
+        FileScanState.scan_id == scan.id, FileScanState.file_id.in_(list(matches))
+    ).update({
+        FileScanState.stage: 'predicted',
+        FileScanState.error: None,
+        FileScanState.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    scan.reused_files_count = (scan.reused_files_count or 0) + len(matches)
+    db.session.commit()
+    
+    return [file_id for file_id in file_ids if file_id not in matches]
+
+def plan_scan_files(file_ids):
+    """
+    Group a scan's files by content, so each distinct content is processed once
+    
+    Files uploaded before content hashing get their hash computed and
+    stored here. Files that no longer exist are left out, as before.
+    
+    Args:
+        file_ids: IDs of the files in the scan
         
+    Returns:
+        tuple: (unique_ids, duplicates) - IDs of the files to process, in
+               order, and for each of them the IDs of the other files with
+               identical contents
+    """
+    files = {file.id: file for file in File.query.filter(File.id.in_(file_ids)).all()}
+    primaries = {}
+    unique_ids = []
+    duplicates = {}
+    for file_id in file_ids:
+        file = files.get(file_id)
+        if file is None:
+            continue
+        if ensure_content_hash(file) is None:
+            unique_ids.append(file_id)
+            continue
+        
+        primary = primaries.setdefault(file.content_hash, file_id)
+        if primary == file_id:
+            unique_ids.append(file_id)
+        else:
+            duplicates.setdefault(primary, []).append(file_id)
+    db.session.commit()
+    return unique_ids, duplicates
+
+def chunk_priority(priority, index):
+    """
+    Celery priority (0 highest) of a scan's chunk task
+    
+    Starts from the scan's priority level and drops a step every
+    SCAN_CHUNKS_PER_PRIORITY_STEP chunks, so running scans' chunks
+    interleave instead of running in submission order.
+    
+    Args:
+        priority (str): Scan priority, one of SCAN_PRIORITIES
+        index (int): Position of the chunk in the scan
+    """
+    return min(9, 3 * SCAN_PRIORITIES.index(priority) + index // config.SCAN_CHUNKS_PER_PRIORITY_STEP)
+
+def submit_scan(scan, num_files):
+    """
+    Queue a scan for processing, starting it right away if a slot is free
+    
+    Args:
+        scan: The scan, with its file stage checkpoints created
+        num_files (int): Number of files to process, for ETAs
+    """
+    scheduler.enqueue(scan.id, scan.user_id, scan.get_priority(), num_files)
+    dispatch_scans()
+
+def dispatch_scans():
+    """Start queued scans while there are free slots"""
+    # Free the slots of scans that ended without releasing them
+    running = scheduler.running()
+    if running:
+        for scan in Scan.query.filter(Scan.id.in_(running), Scan.status.in_(["completed", "failed", "cancelled"])):
+            scheduler.release(scan.id)
+    
+    for scan_id in scheduler.dispatch():
         scan = Scan.query.get(scan_id)
-        if scan:
-            scan.status = "failed"
-            scan.completed_at = datetime.utcnow()
-            db.session.commit()
+        if not scan or scan.status == "cancelled":
+            scheduler.release(scan_id)
+            continue
         
-        return {"error": str(e)}
+        remaining = [
+            state.file_id for state in FileScanState.query.filter(
+                FileScanState.scan_id == scan_id, FileScanState.stage != 'predicted'
+            )
+        ]
+        
+        # Task ID stored first, for cancel; a new run ID retires the tasks
+        # of any earlier run still going
+        task_id = str(uuid.uuid4())
+        scan.run_id = str(uuid.uuid4())
+        scan.add_task_ids([task_id])
+        db.session.commit()
+        process_scan.apply_async((scan_id, remaining, scan.run_id), task_id=task_id, priority=0)
+
+def scan_queue_status(scan_id):
+    """Queue position and ETA of a scan (see ScanScheduler.status), None if unavailable"""
+    try:
+        return scheduler.status(scan_id)
+    except redis.RedisError as e:
+        print(f"Error reading queue status of scan {scan_id}: {str(e)}")
+        return None
+
+@celery.task
+def process_file_chunk(scan_id, file_ids, duplicates=None, run_id=None):
+    """
+    Run a chunk of a scan's files through the analysis pipeline
+    
+    Files already predicted in an earlier run of the chunk are skipped, and
+    stages whose checkpointed artifact is still intact are not redone.
+    
+    Args:
+        scan_id: The ID of the scan being processed
+        file_ids: IDs of the files in this chunk
+        duplicates: (Optional) For files in the chunk, IDs of files with
+                    identical contents that get copies of their results
+        run_id: The scan run this chunk belongs to (see process_scan)
+        
+    Returns:
+        dict: Number of files in the chunk, number that reached prediction,
+              number skipped as already predicted and number of duplicates
+    """
+    duplicates = duplicates or {}
+    num_duplicates = sum(len(ids) for ids in duplicates.values())
+    scan = Scan.query.get(scan_id)
+    if not scan or scan.status == "cancelled" or scan.run_id != run_id:
+        return {"files": len(file_ids), "processed": 0, "skipped": 0, "duplicates": num_duplicates}
+    
+    states = ensure_file_states(scan_id, file_ids)
+    files = File.query.filter(File.id.in_(file_ids)).all()
+    items = [
+        checkpoint_item(file, states[file.id])
+        for file in files if states[file.id].stage != 'predicted'
+    ]
+    
+    # Files overlap across the services: one is normalized while the
+    # previous one is in Joern and earlier ones are being predicted
+    pipeline = build_scan_pipeline(db.engine, should_stop=CancellationCheck(db.engine, scan_id, run_id))
+    processed = 0
+    results = []
+    for item in pipeline.run(items):
+        processed += 1
+        results.append(item)
+        if len(results) >= config.PREDICTION_BATCH_SIZE:
+            save_results(scan_id, results, duplicates, run_id)
+            results = []
+    if results:
+        save_results(scan_id, results, duplicates, run_id)
+    
+    metrics = pipeline.metrics()
+    if pipeline.stopped:
+        print(f"Scan {scan_id} cancelled or resumed, chunk stopped after {processed} files")
+    print(f"Scan {scan_id} chunk pipeline metrics: {json.dumps(metrics)}")
+    return {
+        "files": len(file_ids),
+        "processed": processed,
+        "skipped": len(files) - len(items),
+        "duplicates": num_duplicates,
+        "pipeline": metrics
+    }
+
+class CancellationCheck:
+    """
+    Whether a scan run should stop, for the pipeline's should_stop
+    
+    A run stops once the scan is cancelled, or once a forced resume has
+    replaced it with a new run. Reads the scan on its own connection
+    (pipeline threads call it) at most once per SCAN_CANCEL_CHECK_INTERVAL
+    seconds, so it is cheap enough to call before every file and stage.
+    """
+    
+    def __init__(self, engine, scan_id, run_id=None, interval=None):
+        self.engine = engine
+        self.scan_id = scan_id
+        self.run_id = run_id
+        self.interval = config.SCAN_CANCEL_CHECK_INTERVAL if interval is None else interval
+        self.cancelled = False
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    def __call__(self):
+        with self._lock:
+            if self.cancelled or time.monotonic() - self._checked_at < self.interval:
+                return self.cancelled
+            self._checked_at = time.monotonic()
+            table = Scan.__table__
+            with self.engine.connect() as connection:
+                row = connection.execute(
+                    db.select(table.c.status, table.c.run_id).where(table.c.id == self.scan_id)
+                ).first()
+            self.cancelled = row is None or row.status == "cancelled" or row.run_id != self.run_id
+            return self.cancelled
+
+def cancel_scan_work(scan):
+    """
+    Stop the in-flight work of a cancelled or force-resumed scan
+    
+    Revokes the scan's tasks that have not started, and kills its running
+    Joern processes in the PDG service. Running chunk tasks see the
+    cancelled status or cleared run and stop before their next file or stage.
+    
+    Args:
+        scan: The scan, already marked cancelled or with its run_id cleared
+    """
+    # Drop it from the backlog if it has not started, and free its slot
+    scheduler.remove(scan.id)
+    scheduler.release(scan.id)
+    
+    task_ids = scan.get_task_ids()
+    if task_ids:
+        celery.control.revoke(task_ids)
+    
+    try:
+        get_service_client('pdg').post(
+            f'/cancel/{scan.id}', timeout=(config.SERVICE_CONNECT_TIMEOUT, config.SERVICE_CONNECT_TIMEOUT)
+        )
+    except Exception as e:
+        print(f"Error cancelling PDG generation for scan {scan.id}: {str(e)}")
+    
+    dispatch_scans()
+
+def ensure_file_states(scan_id, file_ids):
+    """
+    Get the stage checkpoints of a scan's files, creating missing ones
+    
+    Args:
+        scan_id: The ID of the scan
+        file_ids: IDs of the files
+        
+    Returns:
+        dict: file_id -> FileScanState
+    """
+    states = {
+        state.file_id: state
+        for state in FileScanState.query.filter(
+            FileScanState.scan_id == scan_id, FileScanState.file_id.in_(file_ids)
+        ).all()
+    }
+    missing = [file_id for file_id in file_ids if file_id not in states]
+    if missing:
+        for file_id in missing:
+            states[file_id] = FileScanState(id=str(uuid.uuid4()), scan_id=scan_id, file_id=file_id)
+            db.session.add(states[file_id])
+        db.session.commit()
+    return states
+
+def checkpoint_item(file, state):
+    """Pipeline item for a file, carrying the artifacts of its completed stages"""
+    item = {'file_id': file.id, 'file_path': file.file_path, 'scan_id': state.scan_id, 'state_id': state.id}
+    for stage in FILE_SCAN_STAGES[1:-1]:
+        item[f'{stage}_path'] = getattr(state, f'{stage}_path')
+        item[f'{stage}_hash'] = getattr(state, f'{stage}_hash')
+    return item
+
+def record_checkpoint(engine, item, **values):
+    """
+    Update a file's stage checkpoint
+    
+    Called from pipeline worker threads, so it uses its own connection
+    instead of the task's session.
+    """
+    table = FileScanState.__table__
+    with engine.begin() as connection:
+        connection.execute(
+            table.update().where(table.c.id == item['state_id']).values(updated_at=datetime.utcnow(), **values)
+        )
+
+def run_checkpointed(engine, item, stage, run_fn, input_path):
+    """
+    Run one of steps 1-3 for a file unless its checkpointed output is intact
+    
+    Args:
+        engine: Database engine for checkpoint updates
+        item (dict): Pipeline item
+        stage (str): normalized, pdg or image
+        run_fn: Service call taking input_path and returning the output path (None on failure)
+        input_path (str): Output of the previous stage
+        
+    Returns:
+        dict: Item with the stage's output path and hash, or None if the stage failed
+    """
+    path, digest = item.get(f'{stage}_path'), item.get(f'{stage}_hash')
+    if path and digest and os.path.exists(path) and file_sha256(path) == digest:
+        return item
+    
+    output_path = run_fn(input_path)
+    if not output_path:
+        record_checkpoint(engine, item, error=f"{stage} stage failed")
+        return None
+    
+    # Later stages were built from the old output, so they are redone too
+    values = {f'{stage}_path': output_path, f'{stage}_hash': file_sha256(output_path)}
+    for later in FILE_SCAN_STAGES[FILE_SCAN_STAGES.index(stage) + 1:-1]:
+        values[f'{later}_path'] = None
+        values[f'{later}_hash'] = None
+    record_checkpoint(engine, item, stage=stage, error=None, **values)
+    return dict(item, **values)
+
+def build_scan_pipeline(engine, should_stop=None):
+    """
+    Pipeline running files through steps 1-4
+    
+    Items are dicts with file_id, file_path, state_id and the checkpointed
+    artifacts; each stage sets the path and hash of its output, and the
+    prediction stage adds the file's vulnerabilities.
+    
+    Args:
+        engine: Database engine for checkpoint updates from the stage threads
+        should_stop: Optional function returning True once the scan is cancelled
+    """
+    return StagePipeline([
+        Stage('normalize', partial(normalize_stage, engine=engine), config.PIPELINE_NORMALIZE_CONCURRENCY),
+        Stage('pdg', partial(pdg_stage, engine=engine), config.PIPELINE_PDG_CONCURRENCY),
+        Stage('image', partial(image_stage, engine=engine), config.PIPELINE_IMAGE_CONCURRENCY),
+        Stage('predict', partial(predict_stage, engine=engine), config.PIPELINE_PREDICT_CONCURRENCY,
+              batch_size=config.PREDICTION_BATCH_SIZE, batch_timeout=config.PIPELINE_BATCH_TIMEOUT)
+    ], queue_size=config.PIPELINE_QUEUE_SIZE, should_stop=should_stop)
+
+def normalize_stage(item, engine):
+    """Step 1: Normalize code"""
+    return run_checkpointed(engine, item, 'normalized', normalize_code, item['file_path'])
+
+def pdg_stage(item, engine):
+    """Step 2: Generate PDG"""
+    # The scan ID lets cancel kill this file's Joern run
+    return run_checkpointed(engine, item, 'pdg', partial(generate_pdg, job_id=item['scan_id']), item['normalized_path'])
+
+def image_stage(item, engine):
+    """Step 3: Generate image representation"""
+    return run_checkpointed(engine, item, 'image', generate_image, item['pdg_path'])
+
+def predict_stage(items, engine):
+    """Step 4: Predict vulnerabilities for a batch of files"""
+    results = predict_vulnerabilities_batch(
+        [item['image_path'] for item in items],
+        [item['file_id'] for item in items]
+    )
+    if results is None:
+        # The whole request failed; the checkpoints say why the files are missing
+        for item in items:
+            record_checkpoint(engine, item, error="predict stage failed: batch request failed")
+        return None
+    # Files that failed on their own are dropped, the rest of the batch goes on
+    predicted = []
+    for item, vulnerabilities in zip(items, results):
+        if vulnerabilities is None:
+            record_checkpoint(engine, item, error="predict stage failed")
+            predicted.append(None)
+        else:
+            predicted.append(dict(item, vulnerabilities=vulnerabilities))
+    return predicted
+
+@celery.task
+def finalize_scan(chunk_results, scan_id, run_id=None):
+    """
+    Chord callback: mark the scan completed
+    
+    The vulnerability counts are already up to date, save_results
+    increments them as each batch is saved.
+    
+    Args:
+        chunk_results: Results of the scan's process_file_chunk tasks
+        scan_id: The ID of the scan
+        run_id: The run the chunks belong to; a replaced run leaves the
+                scan and its scheduler slot to the new one
+    """
+    scan = Scan.query.get(scan_id)
+    if not scan:
+        return {"error": "Scan not found"}
+    if scan.run_id != run_id:
+        return {"status": "superseded", "scan_id": scan_id}
+    
+    # Update scan status
+    if scan.status != "cancelled":
+        scan.status = "completed"
+        scan.completed_at = datetime.utcnow()
+    db.session.commit()
+    
+    # Free the scan's slot for the next queued scan
+    scheduler.release(scan_id, completed=scan.status == "completed")
+    dispatch_scans()
+    
+    stages = {}
+    for result in chunk_results:
+        for name, metrics in result.get("pipeline", {}).get("stages", {}).items():
+            totals = stages.setdefault(name, {"processed": 0, "dropped": 0, "busy_seconds": 0.0, "max_queue_depth": 0})
+            totals["processed"] += metrics["processed"]
+            totals["dropped"] += metrics["dropped"]
+            totals["busy_seconds"] += metrics["busy_seconds"]
+            totals["max_queue_depth"] = max(totals["max_queue_depth"], metrics["max_queue_depth"])
+    
+    return {
+        "status": "success",
+        "scan_id": scan_id,
+        "files": sum(result["files"] for result in chunk_results),
+        "processed": sum(result["processed"] for result in chunk_results),
+        "skipped": sum(result.get("skipped", 0) for result in chunk_results),
+        "duplicates": sum(result.get("duplicates", 0) for result in chunk_results),
+        "stages": stages
+    }
+
+@celery.task
+def scan_failed(request, exc, traceback, scan_id=None, run_id=None):
+    """Chord error callback: mark the scan failed if any chunk raised"""
+    print(f"Error processing scan {scan_id}: {exc!r}")
+    mark_scan_failed(scan_id, run_id)
+
+def mark_scan_failed(scan_id, run_id=None):
+    """Mark a scan failed unless it was cancelled or the failed run was replaced"""
+    db.session.rollback()
+    scan = Scan.query.get(scan_id)
+    if scan and scan.run_id != run_id:
+        return
+    if scan and scan.status != "cancelled":
+        scan.status = "failed"
+        scan.completed_at = datetime.utcnow()
+        db.session.commit()
+    
+    scheduler.release(scan_id)
+    dispatch_scans()
+
+def save_results(scan_id, results, duplicates=None, run_id=None):
+    """
+    Save the PDGs and vulnerabilities of a batch of predicted files
+    
+    Rows are written with bulk inserts, and the scan's counters are
+    incremented in a single UPDATE, which is atomic in the database so
+    chunks of the same scan can save concurrently. The files' checkpoints
+    move to predicted in the same transaction, so a resumed scan never
+    saves a file's results twice.
+    
+    The scan row is locked first and the batch is discarded if run_id is
+    no longer the scan's run, so a run replaced by a forced resume cannot
+    save files the new run also processes.
+    
+    Args:
+        scan_id: The ID of the scan being processed
+        results: Pipeline outputs with file_id, state_id, pdg_path and vulnerabilities
+        duplicates: (Optional) file_id -> IDs of files with identical
+                    contents, which get the same rows as that file
+        run_id: The run that produced the results (see process_scan)
+        
+    Returns:
+        bool: False if the batch was discarded
+    """
+    current = db.session.query(Scan.id).filter(
+        Scan.id == scan_id, Scan.run_id == run_id
+    ).with_for_update().scalar()
+    if current is None:
+        db.session.rollback()
+        print(f"Scan {scan_id} run {run_id} was replaced, discarding {len(results)} results")
+        return False
+    
+    duplicates = duplicates or {}
+    pdg_rows = []
+    vulnerability_rows = []
+    for result in results:
+        if not result['vulnerabilities']:
+            continue
+        
+        # Save PDG to database
+        with open(result['pdg_path'], 'r') as f:
+            pdg_data = f.read()
+        
+        for file_id in [result['file_id']] + duplicates.get(result['file_id'], []):
+            pdg_rows.append({
+                'id': str(uuid.uuid4()),
+                'file_id': file_id,
+                'scan_id': scan_id,
+                'pdg_data': pdg_data
+            })
+            
+            for vuln in result['vulnerabilities']:
+                vulnerability_rows.append({
+                    'id': str(uuid.uuid4()),
+                    'scan_id': scan_id,
+                    'file_id': file_id,
+                    'function_name': vuln.get('function_name'),
+                    'line_number': vuln.get('line_number'),
+                    'severity': vuln.get('severity'),
+                    'vulnerability_type': vuln.get('type'),
+                    'cwe_id': vuln.get('cwe_id'),
+                    'description': vuln.get('description'),
+                    'code_snippet': vuln.get('code_snippet'),
+                    'recommendation': vuln.get('recommendation'),
+                    'confidence_score': vuln.get('confidence_score')
+                })
+    
+    db.session.bulk_insert_mappings(PDG, pdg_rows)
+    db.session.bulk_insert_mappings(Vulnerability, vulnerability_rows)
+    
+    # Update scan counts
+    increment_scan_counts(scan_id, [row['severity'] for row in vulnerability_rows])
+    
+    predicted = {
+        FileScanState.stage: 'predicted',
+        FileScanState.error: None,
+        FileScanState.updated_at: datetime.utcnow()
+    }
+    state_ids = [result['state_id'] for result in results if result.get('state_id')]
+    if state_ids:
+        FileScanState.query.filter(FileScanState.id.in_(state_ids)).update(predicted, synchronize_session=False)
+    duplicate_ids = [file_id for result in results for file_id in duplicates.get(result['file_id'], [])]
+    if duplicate_ids:
+        FileScanState.query.filter(
+            FileScanState.scan_id == scan_id, FileScanState.file_id.in_(duplicate_ids)
+        ).update(predicted, synchronize_session=False)
+    db.session.commit()
+    return True
+
+def artifact_inputs(field, paths, reference_field='input_path'):
+    """
+    Files and form fields that send artifacts to a pipeline service
+    
+    Args:
+        field (str): Upload field name
+        paths: Artifact path, or list of paths
+        reference_field (str): Form field for the paths in reference mode
+        
+    Returns:
+        tuple: (files, data) for ServiceClient.post; in reference mode
+               (ARTIFACT_TRANSFER_MODE) no files, only absolute paths
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+        single = True
+    else:
+        single = False
+    
+    if config.ARTIFACT_TRANSFER_MODE == 'reference':
+        paths = [os.path.abspath(path) for path in paths]
+        return [], {reference_field: paths[0] if single else paths}
+    return [(field, path) for path in paths], {}
+
+def increment_scan_counts(scan_id, severities):
+    """Add vulnerabilities to a scan's counters in a single UPDATE (the caller commits)"""
+    Scan.query.filter_by(id=scan_id).update({
+        Scan.vulnerabilities_count: Scan.vulnerabilities_count + len(severities),
+        Scan.high_severity_count: Scan.high_severity_count + severities.count('high'),
+        Scan.medium_severity_count: Scan.medium_severity_count + severities.count('medium'),
+        Scan.low_severity_count: Scan.low_severity_count + severities.count('low')
+    }, synchronize_session=False)
 
 def normalize_code(file_path):
     """Normalize code by calling the normalization service"""
@@ -130,10 +742,11 @@ def normalize_code(file_path):
         normalized_path = os.path.join(normalized_dir, filename)
         
         # Call normalization service
-        response = requests.post(
-            f"{config.NORMALIZATION_SERVICE_URL}/normalize",
-            files={'file': open(file_path, 'rb')},
-            data={'output_path': normalized_path}
+        files, data = artifact_inputs('file', file_path)
+        response = get_service_client('normalization').post(
+            '/normalize',
+            files=files,
+            data={**data, 'output_path': normalized_path}
         )
         
         if response.status_code != 200:
@@ -145,20 +758,21 @@ def normalize_code(file_path):
         print(f"Error in code normalization: {str(e)}")
         return None
 
-def generate_pdg(file_path):
+def generate_pdg(file_path, job_id=None):
     """Generate PDG from normalized code"""
     try:
         pdg_dir = os.path.join(config.UPLOAD_FOLDER, '../pdgs')
         os.makedirs(pdg_dir, exist_ok=True)
         
         filename = os.path.basename(file_path)
-        pdg_path = os.path.join(pdg_dir, f"{filename}.dot")
+        pdg_path = os.path.join(pdg_dir, f"{filename}.{config.PDG_FORMAT}")
         
         # Call PDG generator service
-        response = requests.post(
-            f"{config.PDG_GENERATOR_SERVICE_URL}/generate_pdg",
-            files={'file': open(file_path, 'rb')},
-            data={'output_path': pdg_path}
+        files, data = artifact_inputs('file', file_path)
+        response = get_service_client('pdg').post(
+            '/generate_pdg',
+            files=files,
+            data={**data, 'output_path': pdg_path, 'output_format': config.PDG_FORMAT, 'job_id': job_id}
         )
         
         if response.status_code != 200:
@@ -180,10 +794,11 @@ def generate_image(pdg_path):
         image_path = os.path.join(image_dir, f"{filename}.pkl")
         
         # Call image generator service
-        response = requests.post(
-            f"{config.IMAGE_GENERATOR_SERVICE_URL}/generate_image",
-            files={'pdg_file': open(pdg_path, 'rb')},
-            data={'output_path': image_path}
+        files, data = artifact_inputs('pdg_file', pdg_path)
+        response = get_service_client('image').post(
+            '/generate_image',
+            files=files,
+            data={**data, 'output_path': image_path}
         )
         
         if response.status_code != 200:
@@ -199,10 +814,11 @@ def predict_vulnerabilities(image_path, file_id):
     """Predict vulnerabilities from image representation"""
     try:
         # Call prediction service
-        response = requests.post(
-            f"{config.PREDICTION_SERVICE_URL}/predict",
-            files={'image_file': open(image_path, 'rb')},
-            data={'file_id': file_id}
+        files, data = artifact_inputs('image_file', image_path)
+        response = get_service_client('prediction').post(
+            '/predict',
+            files=files,
+            data={**data, 'file_id': file_id}
         )
         
         if response.status_code != 200:
@@ -213,4 +829,32 @@ def predict_vulnerabilities(image_path, file_id):
         return result.get('vulnerabilities', [])
     except Exception as e:
         print(f"Error in vulnerability prediction: {str(e)}")
+        return None
+
+def predict_vulnerabilities_batch(image_paths, file_ids):
+    """Predict vulnerabilities for many image representations in one request"""
+    try:
+        files, data = artifact_inputs('image_files', list(image_paths), reference_field='image_paths')
+        response = get_service_client('prediction').post(
+            '/predict/batch',
+            files=files,
+            data={**data, 'file_ids': file_ids}
+        )
+        
+        if response.status_code != 200:
+            print(f"Batch vulnerability prediction failed: {response.text}")
+            return None
+        
+        # A file the service could not predict gets an error instead of
+        # vulnerabilities; None keeps it from being saved as clean
+        vulnerabilities = []
+        for result in response.json().get('results', []):
+            if 'error' in result:
+                print(f"Vulnerability prediction failed for file {result.get('file_id')}: {result['error']}")
+                vulnerabilities.append(None)
+            else:
+                vulnerabilities.append(result.get('vulnerabilities', []))
+        return vulnerabilities
+    except Exception as e:
+        print(f"Error in batch vulnerability prediction: {str(e)}")
         return None
\ No newline at end of file
@@ -0,0 +1,111 @@
+import os
+import threading
+from contextlib import ExitStack
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import config
+
+# Every pipeline service writes its output to the output_path it is given,
+# so repeating a POST is safe; retry overloaded or restarting services.
+# Read timeouts are not retried: the service may still be working on the
+# request (a hung Joern run), and resending it would start the work again
+RETRY_STATUSES = (429, 502, 503, 504)
+
+class ServiceClient:
+    """
+    Pooled HTTP client for one pipeline service
+
+    Keeps connections alive across calls, retries connection errors and
+    RETRY_STATUSES with exponential backoff (honouring Retry-After) but
+    not read timeouts, applies the service's timeout, and closes uploaded
+    files once the request is sent.
+    """
+
+    def __init__(self, base_url, timeout, retries=None, backoff_factor=None, pool_size=None):
+        """
+        Args:
+            base_url (str): Service URL
+            timeout (tuple): (connect, read) timeout in seconds
+            retries (int): Maximum retries per call
+            backoff_factor (float): Backoff between retries is backoff_factor * 2 ** (retry - 1)
+            pool_size (int): Maximum kept-alive connections to the service
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retry = Retry(
+            total=config.SERVICE_RETRIES if retries is None else retries,
+            read=0,
+            backoff_factor=config.SERVICE_RETRY_BACKOFF if backoff_factor is None else backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({'GET', 'POST'}),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        pool_size = config.SERVICE_POOL_SIZE if pool_size is None else pool_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=self.retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def post(self, path, files=None, data=None, timeout=None):
+        """
+        POST to the service
+
+        Args:
+            path (str): Endpoint path
+            files (list): (field, file_path) pairs to upload
+            data (dict): Form fields
+            timeout (tuple): Overrides the service timeout
+
+        Returns:
+            requests.Response
+        """
+        with ExitStack() as stack:
+            uploads = [
+                (field, (os.path.basename(file_path), stack.enter_context(open(file_path, 'rb'))))
+                for field, file_path in files or []
+            ]
+            return self.session.post(
+                f"{self.base_url}{path}",
+                files=uploads or None,
+                data=data,
+                timeout=timeout or self.timeout
+            )
+
+    def close(self):
+        self.session.close()
+
+def service_settings(name):
+    """(base_url, (connect, read) timeout) of a pipeline service"""
+    settings = {
+        'normalization': (config.NORMALIZATION_SERVICE_URL, config.NORMALIZATION_TIMEOUT),
+        'pdg': (config.PDG_GENERATOR_SERVICE_URL, config.PDG_GENERATION_TIMEOUT),
+        'image': (config.IMAGE_GENERATOR_SERVICE_URL, config.IMAGE_GENERATION_TIMEOUT),
+        'prediction': (config.PREDICTION_SERVICE_URL, config.PREDICTION_TIMEOUT)
+    }
+    base_url, read_timeout = settings[name]
+    return base_url, (config.SERVICE_CONNECT_TIMEOUT, read_timeout)
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_service_client(name):
+    """
+    Shared pooled client for a pipeline service
+
+    Created on first use, so each Celery worker process gets its own
+    connection pool after forking.
+
+    Args:
+        name (str): normalization, pdg, image or prediction
+
+    Returns:
+        ServiceClient
+    """
+    with _clients_lock:
+        client = _clients.get((os.getpid(), name))
+        if client is None:
+            client = ServiceClient(*service_settings(name))
+            _clients[(os.getpid(), name)] = client
+        return client
@@ -1,5 +1,6 @@
 import re
 from marshmallow import Schema, fields, validate, ValidationError
+from models.scan import SCAN_PRIORITIES
 
 # Email regex pattern
 EMAIL_REGEX = re.compile(r"[^@]+@[^@]+\.[^@]+")
@@ -58,6 +59,8 @@ class ScanOptionsSchema(Schema):
     includeLibraries = fields.Bool()
     detailedReport = fields.Bool()
     pdgVisualization = fields.Bool()
+    incremental = fields.Bool()
+    priority = fields.Str(validate=validate.OneOf(SCAN_PRIORITIES))
 
 def validate_file_extension(filename, allowed_extensions):
     """
@@ -1,62 +1,70 @@
 from flask import Flask, request, jsonify
 import os
-import tempfile
 import pickle
 import networkx as nx
-from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 
 # Import image generator modules
-from generator.image_generator import generate_image_representation
+from generator.image_generator import generate_image_representation, generate_image_from_arrays
+from generator.pdg_arrays import PDGArrays
 from generator.sent2vec_wrapper import load_sent2vec_model
+from generator.centrality import get_katz_stats
+from generator.model_loader import BackgroundModelLoader
+from generator.projection import load_projection
+from generator.shared_input import InputError, get_request_input, save_upload, remove_upload
 
-# Load Sent2Vec model at startup
-sent2vec_model = None
-@app.before_first_request
-def initialize():
-    global sent2vec_model
-    model_path = os.environ.get('SENT2VEC_MODEL_PATH', '../models/sent2vec_model.bin')
-    sent2vec_model = load_sent2vec_model(model_path)
+# Load Sent2Vec model in the background at startup; requests wait for it
+# for up to MODEL_WAIT_TIMEOUT seconds
+MODEL_WAIT_TIMEOUT = float(os.environ.get('MODEL_WAIT_TIMEOUT', 60))
+sent2vec_loader = BackgroundModelLoader(
+    load_sent2vec_model,
+    os.environ.get('SENT2VEC_MODEL_PATH', '../models/sent2vec_model.bin'),
+    name='Sent2Vec'
+)
+sent2vec_loader.start()
+
+# Optional PCA projection of the embeddings, learned offline (see generator/projection.py)
+embedding_projection = None
+if os.environ.get('EMBEDDING_PROJECTION_PATH'):
+    embedding_projection = load_projection(os.environ['EMBEDDING_PROJECTION_PATH'])
 
 @app.route('/generate_image', methods=['POST'])
 def generate_image():
     """
     Generate an image representation from a PDG file
     
-    POST parameters:
-    - pdg_file: PDG file in DOT format
+    POST parameters, either:
+    - pdg_file: PDG file in DOT format, or in the PDG service's JSON format (.json)
+    - input_path: Path of the PDG file on the shared data volume
+    and:
     - output_path: (Optional) Where to save the generated image
     """
-    global sent2vec_model
-    
-    # Check if model is loaded
+    # Wait for the model if it is still loading
+    sent2vec_model = sent2vec_loader.wait(MODEL_WAIT_TIMEOUT)
     if sent2vec_model is None:
-        return jsonify({'error': 'Sent2Vec model not initialized'}), 500
-    
-    # Check if file was uploaded
-    if 'pdg_file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['pdg_file']
+        return jsonify({'error': 'Sent2Vec model not ready', 'model': sent2vec_loader.status()}), 503
     
-    # Check if filename is empty
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    try:
+        filename, pdg_path = get_request_input(request, 'pdg_file')
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Check file extension
-    if not file.filename.endswith('.dot'):
-        return jsonify({'error': 'File must be in DOT format'}), 400
+    if not filename.endswith(('.dot', '.json')):
+        return jsonify({'error': 'File must be in DOT or JSON format'}), 400
     
-    # Save the uploaded file to a temporary location
-    filename = secure_filename(file.filename)
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, filename)
-    file.save(temp_path)
+    temp_dir = None
+    if pdg_path is None:
+        # Save the uploaded file to a temporary location
+        pdg_path, temp_dir = save_upload(request.files['pdg_file'], filename)
     
     try:
-        # Load the PDG from the DOT file
-        pdg = nx.drawing.nx_pydot.read_dot(temp_path)
+        # JSON PDGs are loaded straight into arrays, skipping DOT parsing
+        if filename.endswith('.json'):
+            pdg = PDGArrays.from_json_file(pdg_path)
+        else:
+            pdg = nx.drawing.nx_pydot.read_dot(pdg_path)
         
         # Determine output path
         output_path = request.form.get('output_path')
@@ -67,7 +75,10 @@ def generate_image():
             output_path = os.path.join(output_dir, f"{os.path.splitext(filename)[0]}.pkl")
         
         # Generate image representation
-        image_data = generate_image_representation(pdg, sent2vec_model)
+        if isinstance(pdg, PDGArrays):
+            image_data = generate_image_from_arrays(pdg, sent2vec_model, projection=embedding_projection)
+        else:
+            image_data = generate_image_representation(pdg, sent2vec_model, projection=embedding_projection)
         
         # Save image representation
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -83,17 +94,27 @@ def generate_image():
         return jsonify({'error': str(e)}), 500
     
     finally:
-        # Clean up temporary files
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
+        # Clean up temporary files (never the by-reference input)
+        remove_upload(pdg_path, temp_dir)
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Simple health check endpoint"""
-    status = 'ok' if sent2vec_model is not None else 'model not loaded'
-    return jsonify({'status': status}), 200
+    """Liveness check: the process is up, whether or not the model is loaded"""
+    return jsonify({'status': 'ok', 'model': sent2vec_loader.state}), 200
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: only ready once the Sent2Vec model is loaded"""
+    status = sent2vec_loader.status()
+    return jsonify(status), 200 if sent2vec_loader.is_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Centrality counters and model load metrics"""
+    return jsonify({
+        'katz': get_katz_stats(),
+        'model_loading': sent2vec_loader.status()
+    }), 200
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5003)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Accuracy report for approximate closeness centrality
+
+Generates image representations for a labeled sample of PDGs with both the
+exact and the approximate closeness channel, runs them through the
+prediction service and reports how much the predictions change.
+
+Usage (from image_generator_service/):
+    python -m benchmarks.closeness_accuracy --manifest sample.csv \
+        --sent2vec ../models/sent2vec_model.bin --prediction-url http://localhost:5004
+
+The manifest is a CSV file with the columns pdg_path,label where label is
+1 for vulnerable and 0 for safe.
+"""
+import argparse
+import csv
+import io
+import json
+import pickle
+import time
+import numpy as np
+import networkx as nx
+import requests
+
+from generator.image_generator import generate_image_representation
+from generator.sent2vec_wrapper import load_sent2vec_model
+
+def predict(prediction_url, image_data, name):
+    """Send an image representation to the prediction service"""
+    buffer = io.BytesIO(pickle.dumps(image_data))
+    response = requests.post(
+        f"{prediction_url}/predict",
+        files={'image_file': (f"{name}.pkl", buffer)}
+    )
+    response.raise_for_status()
+    return response.json()['is_vulnerable']
+
+def run_report(manifest, sent2vec_model, prediction_url, epsilon=None):
+    """
+    Compare exact and approximate closeness channels on a labeled sample
+
+    Args:
+        manifest (str): Path to the CSV manifest
+        sent2vec_model: Loaded Sent2Vec model
+        prediction_url (str): Base URL of the prediction service
+        epsilon (float): Approximation error to evaluate (defaults to CLOSENESS_APPROX_EPSILON)
+
+    Returns:
+        dict: Accuracy report
+    """
+    import generator.centrality as centrality
+    if epsilon is not None:
+        centrality.CLOSENESS_APPROX_EPSILON = epsilon
+
+    with open(manifest, newline='') as f:
+        samples = list(csv.DictReader(f))
+
+    rows = []
+    for sample in samples:
+        pdg = nx.drawing.nx_pydot.read_dot(sample['pdg_path'])
+        label = bool(int(sample['label']))
+
+        start = time.perf_counter()
+        exact = generate_image_representation(pdg, sent2vec_model, closeness_mode='exact')
+        exact_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx = generate_image_representation(pdg, sent2vec_model, closeness_mode='approx')
+        approx_seconds = time.perf_counter() - start
+
+        exact_closeness = np.asarray(exact[1])
+        approx_closeness = np.asarray(approx[1])
+
+        rows.append({
+            'pdg_path': sample['pdg_path'],
+            'nodes': pdg.number_of_nodes(),
+            'label': label,
+            'exact_prediction': predict(prediction_url, exact, 'exact'),
+            'approx_prediction': predict(prediction_url, approx, 'approx'),
+            'channel_max_abs_error': float(np.max(np.abs(exact_closeness - approx_closeness))),
+            'exact_seconds': exact_seconds,
+            'approx_seconds': approx_seconds
+        })
+
+    total = len(rows)
+    if not total:
+        return {'samples': 0}
+
+    return {
+        'samples': total,
+        'epsilon': centrality.CLOSENESS_APPROX_EPSILON,
+        'delta': centrality.CLOSENESS_APPROX_DELTA,
+        'exact_accuracy': sum(r['exact_prediction'] == r['label'] for r in rows) / total,
+        'approx_accuracy': sum(r['approx_prediction'] == r['label'] for r in rows) / total,
+        'prediction_agreement': sum(r['exact_prediction'] == r['approx_prediction'] for r in rows) / total,
+        'max_channel_abs_error': max(r['channel_max_abs_error'] for r in rows),
+        'exact_seconds': sum(r['exact_seconds'] for r in rows),
+        'approx_seconds': sum(r['approx_seconds'] for r in rows),
+        'details': rows
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exact vs approximate closeness accuracy report')
+    parser.add_argument('--manifest', required=True, help='CSV file with pdg_path,label columns')
+    parser.add_argument('--sent2vec', default='../models/sent2vec_model.bin', help='Sent2Vec model path')
+    parser.add_argument('--prediction-url', default='http://localhost:5004', help='Prediction service URL')
+    parser.add_argument('--epsilon', type=float, help='Approximation error to evaluate')
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    model = load_sent2vec_model(args.sent2vec)
+    if model is None:
+        raise SystemExit('Sent2Vec model could not be loaded')
+
+    report = run_report(args.manifest, model, args.prediction_url, args.epsilon)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
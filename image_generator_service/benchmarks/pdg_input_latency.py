@@ -0,0 +1,126 @@
+"""
+Latency benchmark: DOT input vs JSON node/edge input
+
+Times PDG loading plus image generation for the same graphs given as DOT
+(read with pydot) and as the PDG service's JSON format (loaded straight into
+arrays). With --image-url the files are also posted to a running image
+service to measure end-to-end request latency.
+
+Usage (from image_generator_service/):
+    python -m benchmarks.pdg_input_latency --dot ../data/pdgs/*.dot
+    python -m benchmarks.pdg_input_latency --synthetic-nodes 500 2000 8000
+
+Without --sent2vec, random vectors stand in for the Sent2Vec embeddings so
+that only graph loading and centrality computation are measured.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+import networkx as nx
+import requests
+
+from generator.image_generator import generate_image_representation, generate_image_from_arrays
+from generator.pdg_arrays import PDGArrays
+from generator.sent2vec_wrapper import load_sent2vec_model
+
+class RandomEmbedder:
+    """Stand-in for a Sent2Vec model that returns random vectors"""
+
+    def __init__(self, embedding_size=128, seed=0):
+        self.embedding_size = embedding_size
+        self.rng = np.random.default_rng(seed)
+
+    def embed_sentence(self, sentence):
+        return self.rng.standard_normal((1, self.embedding_size)).astype(np.float32)
+
+def synthetic_pdg(num_nodes, seed=0):
+    """Random sparse directed graph with PDG-like node attributes"""
+    graph = nx.gnm_random_graph(num_nodes, num_nodes * 3, seed=seed, directed=True)
+    pdg = nx.DiGraph()
+    for node in graph.nodes():
+        pdg.add_node(str(node), label=f"main:{node}", code=f"int v{node} = v{node} + 1 ;",
+                     method='main', line=node)
+    for src, dst in graph.edges():
+        pdg.add_edge(str(src), str(dst), type='DDG')
+    return pdg
+
+def time_runs(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def post_file(image_url, path):
+    with open(path, 'rb') as f:
+        response = requests.post(f"{image_url}/generate_image",
+                                 files={'pdg_file': (os.path.basename(path), f)})
+    response.raise_for_status()
+
+def benchmark(dot_path, json_path, model, repeat, image_url=None):
+    """
+    Benchmark one graph stored as both DOT and JSON
+
+    Returns:
+        dict: Median latencies in seconds for each input mode
+    """
+    def dot_pipeline():
+        pdg = nx.drawing.nx_pydot.read_dot(dot_path)
+        generate_image_representation(pdg, model)
+
+    def json_pipeline():
+        arrays = PDGArrays.from_json_file(json_path)
+        generate_image_from_arrays(arrays, model)
+
+    result = {
+        'dot_seconds': statistics.median(time_runs(dot_pipeline, repeat)),
+        'json_seconds': statistics.median(time_runs(json_pipeline, repeat))
+    }
+
+    if image_url:
+        result['dot_http_seconds'] = statistics.median(
+            time_runs(lambda: post_file(image_url, dot_path), repeat))
+        result['json_http_seconds'] = statistics.median(
+            time_runs(lambda: post_file(image_url, json_path), repeat))
+
+    result['speedup'] = result['dot_seconds'] / result['json_seconds'] if result['json_seconds'] else None
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='DOT vs JSON PDG input latency benchmark')
+    parser.add_argument('--dot', nargs='*', default=[], help='DOT files to benchmark')
+    parser.add_argument('--synthetic-nodes', nargs='*', type=int, default=[],
+                        help='Sizes of random graphs to benchmark')
+    parser.add_argument('--sent2vec', help='Sent2Vec model path (random embeddings if omitted)')
+    parser.add_argument('--image-url', help='Also time requests against this image service')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    model = load_sent2vec_model(args.sent2vec) if args.sent2vec else RandomEmbedder()
+    if model is None:
+        raise SystemExit('Sent2Vec model could not be loaded')
+
+    work_dir = tempfile.mkdtemp()
+    graphs = [(path, nx.drawing.nx_pydot.read_dot(path)) for path in args.dot]
+    for size in args.synthetic_nodes:
+        dot_path = os.path.join(work_dir, f"synthetic_{size}.dot")
+        pdg = synthetic_pdg(size)
+        nx.drawing.nx_pydot.write_dot(pdg, dot_path)
+        graphs.append((dot_path, pdg))
+
+    report = []
+    for dot_path, pdg in graphs:
+        json_path = os.path.join(work_dir, f"{os.path.basename(dot_path)}.json")
+        with open(json_path, 'w') as f:
+            json.dump(PDGArrays.from_networkx(pdg).to_json(), f)
+
+        result = benchmark(dot_path, json_path, model, args.repeat, args.image_url)
+        result.update({'pdg': dot_path, 'nodes': pdg.number_of_nodes(), 'edges': pdg.number_of_edges()})
+        report.append(result)
+
+    print(json.dumps(report, indent=2))
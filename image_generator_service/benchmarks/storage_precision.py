@@ -0,0 +1,116 @@
+"""
+Evaluation of image storage precision and embedding projection
+
+For each PDG in the sample, generates the full-precision (float64) image and
+the reduced variants (float32, float16 and, with --projection, PCA-projected
+float16), then reports pickle size, load time and prediction agreement with
+the full-precision pipeline.
+
+Usage (from image_generator_service/):
+    python -m benchmarks.storage_precision --pdgs ../data/pdgs/*.dot \
+        --sent2vec ../models/sent2vec_model.bin --prediction-url http://localhost:5004
+
+Projected images need a model trained on the projected embedding size, so
+their predictions are requested from --projected-prediction-url and compared
+against the full-precision predictions of --prediction-url.
+"""
+import argparse
+import io
+import json
+import pickle
+import statistics
+import time
+import networkx as nx
+import requests
+
+from generator.image_generator import generate_image_representation, generate_image_from_arrays
+from generator.pdg_arrays import PDGArrays
+from generator.projection import load_projection
+from generator.sent2vec_wrapper import load_sent2vec_model
+
+def load_pdg(path):
+    if path.endswith('.json'):
+        return PDGArrays.from_json_file(path)
+    return nx.drawing.nx_pydot.read_dot(path)
+
+def generate(pdg, model, dtype, projection=None):
+    if isinstance(pdg, PDGArrays):
+        return generate_image_from_arrays(pdg, model, dtype=dtype, projection=projection)
+    return generate_image_representation(pdg, model, dtype=dtype, projection=projection)
+
+def load_seconds(payload, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pickle.loads(payload)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+def predict(prediction_url, payload):
+    response = requests.post(
+        f"{prediction_url}/predict",
+        files={'image_file': ('image.pkl', io.BytesIO(payload))}
+    )
+    response.raise_for_status()
+    return response.json()['is_vulnerable']
+
+def run_evaluation(pdg_paths, model, prediction_url=None, projection=None, projected_prediction_url=None):
+    """
+    Compare reduced-precision images against the float64 pipeline
+
+    Returns:
+        dict: Per-variant size reduction, load-time gain and prediction agreement
+    """
+    variants = {'float32': ('float32', None), 'float16': ('float16', None)}
+    if projection is not None:
+        variants['pca_float16'] = ('float16', projection)
+
+    totals = {name: {'bytes': 0, 'load_seconds': 0.0, 'agree': 0, 'compared': 0}
+              for name in ['float64'] + list(variants)}
+
+    for path in pdg_paths:
+        pdg = load_pdg(path)
+        reference = pickle.dumps(generate(pdg, model, 'float64'))
+        totals['float64']['bytes'] += len(reference)
+        totals['float64']['load_seconds'] += load_seconds(reference)
+        reference_prediction = predict(prediction_url, reference) if prediction_url else None
+
+        for name, (dtype, variant_projection) in variants.items():
+            payload = pickle.dumps(generate(pdg, model, dtype, variant_projection))
+            totals[name]['bytes'] += len(payload)
+            totals[name]['load_seconds'] += load_seconds(payload)
+
+            url = projected_prediction_url if variant_projection is not None else prediction_url
+            if reference_prediction is not None and url:
+                totals[name]['compared'] += 1
+                totals[name]['agree'] += predict(url, payload) == reference_prediction
+
+    baseline = totals['float64']
+    report = {'samples': len(pdg_paths), 'float64_bytes': baseline['bytes']}
+    for name in variants:
+        stats = totals[name]
+        report[name] = {
+            'bytes': stats['bytes'],
+            'size_reduction': 1 - stats['bytes'] / baseline['bytes'] if baseline['bytes'] else None,
+            'load_speedup': baseline['load_seconds'] / stats['load_seconds'] if stats['load_seconds'] else None,
+            'prediction_agreement': stats['agree'] / stats['compared'] if stats['compared'] else None
+        }
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Image storage precision evaluation')
+    parser.add_argument('--pdgs', nargs='+', required=True, help='PDG files (.dot or .json)')
+    parser.add_argument('--sent2vec', default='../models/sent2vec_model.bin', help='Sent2Vec model path')
+    parser.add_argument('--prediction-url', help='Prediction service for the agreement check')
+    parser.add_argument('--projection', help='PCA projection (.npz) to evaluate')
+    parser.add_argument('--projected-prediction-url', help='Prediction service running a model for projected images')
+    args = parser.parse_args()
+
+    sent2vec_model = load_sent2vec_model(args.sent2vec)
+    if sent2vec_model is None:
+        raise SystemExit('Sent2Vec model could not be loaded')
+    projection = load_projection(args.projection) if args.projection else None
+
+    report = run_evaluation(args.pdgs, sent2vec_model, args.prediction_url, projection,
+                            args.projected_prediction_url)
+    print(json.dumps(report, indent=2))
@@ -1,84 +1,108 @@
+import os
 import numpy as np
-import networkx as nx
 from generator.sent2vec_wrapper import sentence_embedding
+from generator.centrality import closeness_centrality, degree_centrality, katz_centrality
+from generator.pdg_arrays import PDGArrays
+from generator.projection import apply_projection
 
-def generate_image_representation(pdg, sent2vec_model, embedding_size=128):
+# Storage precision of the image channels: float64, float32 or float16.
+# The model computes in float32, so float32 loses nothing at prediction time.
+IMAGE_DTYPE = os.environ.get('IMAGE_DTYPE', 'float32')
+
+def _empty_image(embedding_size, dtype, projection=None):
+    """Single all-zero row per channel, used when no node has code"""
+    if projection is not None:
+        embedding_size = projection['components'].shape[0]
+    dummy = np.zeros((1, embedding_size), dtype=dtype or IMAGE_DTYPE)
+    return (dummy, dummy.copy(), dummy.copy(), [])
+
+def generate_image_representation(pdg, sent2vec_model, embedding_size=128, closeness_mode=None,
+                                  dtype=None, projection=None):
     """
     Generate an image representation from a Program Dependency Graph
-    
+
     Args:
         pdg (networkx.DiGraph): Program Dependency Graph
         sent2vec_model: Loaded Sent2Vec model
         embedding_size (int): Embedding vector size
-        
+        closeness_mode (str): 'exact', 'approx' or 'auto' (defaults to CLOSENESS_MODE)
+        dtype (str): Storage precision of the channels (defaults to IMAGE_DTYPE)
+        projection (dict): Optional PCA projection applied to every embedding
+
+    Returns:
+        tuple: (degree_channel, closeness_channel, katz_channel, row_info) - the three channels of
+        the image, each a (num_lines, embedding_size) array, and the function and line of each row
+    """
+    try:
+        arrays = PDGArrays.from_networkx(pdg)
+    except Exception as e:
+        print(f"Error generating image representation: {str(e)}")
+        return _empty_image(embedding_size, dtype, projection)
+
+    return generate_image_from_arrays(arrays, sent2vec_model, embedding_size, closeness_mode,
+                                      dtype, projection)
+
+def generate_image_from_arrays(arrays, sent2vec_model, embedding_size=128, closeness_mode=None,
+                               dtype=None, projection=None):
+    """
+    Generate an image representation from a PDG in array form
+
+    Args:
+        arrays (PDGArrays): Program Dependency Graph as index arrays
+        sent2vec_model: Loaded Sent2Vec model
+        embedding_size (int): Embedding vector size
+        closeness_mode (str): 'exact', 'approx' or 'auto' (defaults to CLOSENESS_MODE)
+        dtype (str): Storage precision of the channels (defaults to IMAGE_DTYPE)
+        projection (dict): Optional PCA projection applied to every embedding
+
     Returns:
-        tuple: (degree_channel, closeness_channel, katz_channel) - the three channels of the image
+        tuple: (degree_channel, closeness_channel, katz_channel, row_info) - the three channels of
+        the image, each a (num_lines, embedding_size) array, and the function and line of each row
     """
+    dtype = dtype or IMAGE_DTYPE
     try:
-        # Extract code and labels from PDG
-        labels_code = {}
-        for node, attrs in pdg.nodes(data=True):
-            # Extract code attribute
-            code = attrs.get('code', '')
-            if not code and 'label' in attrs:
-                # Extract code from label if available
-                label_text = attrs['label']
-                if ',' in label_text:
-                    code = label_text[label_text.index(',') + 1:].strip()
-            
-            if code:
-                labels_code[node] = code
-        
         # Calculate centrality measures
-        degree_cen_dict = nx.degree_centrality(pdg)
-        closeness_cen_dict = nx.closeness_centrality(pdg)
-        
-        # For directed graphs, convert to DiGraph for katz_centrality
-        G = nx.DiGraph(pdg) if not isinstance(pdg, nx.DiGraph) else pdg
-        try:
-            katz_cen_dict = nx.katz_centrality(G)
-        except Exception:
-            # Fallback if katz_centrality fails (e.g., convergence issues)
-            katz_cen_dict = {node: 0.5 for node in G.nodes()}
-        
-        # Initialize channels
-        degree_channel = []
-        closeness_channel = []
-        katz_channel = []
-        
-        # Generate weighted embeddings for each node with code
-        for node, code in labels_code.items():
+        adjacency = arrays.adjacency()
+        degree_cen = degree_centrality(adjacency)
+        closeness_cen = closeness_centrality(adjacency, mode=closeness_mode)
+        katz_cen = katz_centrality(adjacency)
+
+        # Embed each node with code
+        rows = []
+        line_vecs = []
+        for node, code in enumerate(arrays.codes):
+            if not code:
+                continue
+
             # Get embedding vector
             line_vec = sentence_embedding(sent2vec_model, code)
-            
+
             # Skip if embedding failed
             if line_vec is None:
                 continue
-            
-            line_vec = np.array(line_vec)
-            
-            # Apply centrality weights
-            degree_cen = degree_cen_dict.get(node, 0.5)
-            degree_channel.append(degree_cen * line_vec)
-            
-            closeness_cen = closeness_cen_dict.get(node, 0.5)
-            closeness_channel.append(closeness_cen * line_vec)
-            
-            katz_cen = katz_cen_dict.get(node, 0.5)
-            katz_channel.append(katz_cen * line_vec)
-        
+
+            rows.append(node)
+            line_vecs.append(line_vec)
+
         # Handle empty channels (no valid code found)
-        if not degree_channel:
-            # Create a dummy channel with zeros
-            dummy_vec = np.zeros(embedding_size)
-            degree_channel = [dummy_vec]
-            closeness_channel = [dummy_vec]
-            katz_channel = [dummy_vec]
-        
-        return (degree_channel, closeness_channel, katz_channel)
-    
+        if not rows:
+            return _empty_image(embedding_size, dtype, projection)
+
+        embeddings = np.asarray(line_vecs, dtype=np.float64)
+        if projection is not None:
+            embeddings = apply_projection(embeddings, projection)
+
+        # Apply centrality weights
+        degree_channel = (degree_cen[rows, None] * embeddings).astype(dtype)
+        closeness_channel = (closeness_cen[rows, None] * embeddings).astype(dtype)
+        katz_channel = (katz_cen[rows, None] * embeddings).astype(dtype)
+
+        # Source location of every image row, for per-function predictions
+        row_info = [{'function': arrays.methods[node], 'line': arrays.lines[node]} for node in rows]
+
+        return (degree_channel, closeness_channel, katz_channel, row_info)
+
     except Exception as e:
         print(f"Error generating image representation: {str(e)}")
         # Return empty channels
-        dummy_vec = np.zeros(embedding_size)
-        return ([dummy_vec], [dummy_vec], [dummy_vec])
\ No newline at end of file
+        return _empty_image(embedding_size, dtype, projection)
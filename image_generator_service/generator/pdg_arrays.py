@@ -0,0 +1,140 @@
+import json
+import numpy as np
+from scipy import sparse
+
+def _unquote(value):
+    """Strip the quoting pydot adds around DOT attribute values"""
+    if isinstance(value, str) and len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1].replace('\\"', '"')
+    return value
+
+def _to_line(value):
+    try:
+        return int(_unquote(value))
+    except (TypeError, ValueError):
+        return -1
+
+class PDGArrays:
+    """
+    Array form of a Program Dependency Graph
+
+    Nodes are numbered 0..n-1 in their original order and edges are stored as
+    two parallel index arrays, which is all the image generator needs to
+    compute centralities with scipy.sparse.
+    """
+
+    def __init__(self, node_ids, codes, methods, lines, src, dst):
+        """
+        Args:
+            node_ids (list): Original node identifiers
+            codes (list): Source code of each node ('' if none)
+            methods (list): Method each node belongs to
+            lines (list): Line number of each node (-1 if unknown)
+            src (numpy.ndarray): Edge source indices
+            dst (numpy.ndarray): Edge target indices
+        """
+        self.node_ids = node_ids
+        self.codes = codes
+        self.methods = methods
+        self.lines = lines
+        self.src = np.asarray(src, dtype=np.int64)
+        self.dst = np.asarray(dst, dtype=np.int64)
+
+    @property
+    def num_nodes(self):
+        return len(self.node_ids)
+
+    def adjacency(self, binary=False):
+        """
+        Sparse adjacency matrix, entry (i, j) for edge i -> j
+
+        Args:
+            binary (bool): Collapse parallel edges to a single 1 entry
+
+        Returns:
+            scipy.sparse.csr_matrix: n x n adjacency matrix
+        """
+        n = self.num_nodes
+        data = np.ones(len(self.src))
+        adjacency = sparse.csr_matrix((data, (self.src, self.dst)), shape=(n, n))
+        if binary:
+            adjacency.data[:] = 1.0
+        return adjacency
+
+    @classmethod
+    def from_networkx(cls, pdg):
+        """
+        Build arrays from a networkx PDG (e.g. one read from a DOT file)
+
+        Args:
+            pdg (networkx.DiGraph): Program Dependency Graph
+
+        Returns:
+            PDGArrays: Array form of the graph
+        """
+        node_ids = []
+        codes = []
+        methods = []
+        lines = []
+        index = {}
+        for node, attrs in pdg.nodes(data=True):
+            index[node] = len(node_ids)
+            node_ids.append(node)
+
+            # Extract code attribute (kept exactly as pydot returns it, quotes
+            # included, so DOT inputs embed as they always have)
+            code = attrs.get('code', '')
+            if not code and 'label' in attrs:
+                # Extract code from label if available
+                label_text = attrs['label']
+                if ',' in label_text:
+                    code = label_text[label_text.index(',') + 1:].strip()
+            codes.append(code or '')
+            methods.append(_unquote(attrs.get('method', '')))
+            lines.append(_to_line(attrs.get('line', -1)))
+
+        edges = [(index[u], index[v]) for u, v in pdg.edges()]
+        src = [u for u, _ in edges]
+        dst = [v for _, v in edges]
+        return cls(node_ids, codes, methods, lines, src, dst)
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Build arrays from the PDG service's JSON format
+
+        The format is {"nodes": [{"id", "code", "method", "line"}, ...],
+        "edges": [[src_index, dst_index, type], ...]}.
+
+        Args:
+            data (dict): Parsed JSON document
+
+        Returns:
+            PDGArrays: Array form of the graph
+        """
+        nodes = data.get('nodes', [])
+        edges = data.get('edges', [])
+        edge_array = np.array([edge[:2] for edge in edges], dtype=np.int64).reshape(-1, 2)
+        return cls(
+            [str(node.get('id', i)) for i, node in enumerate(nodes)],
+            [node.get('code') or '' for node in nodes],
+            [node.get('method', '') for node in nodes],
+            [_to_line(node.get('line', -1)) for node in nodes],
+            edge_array[:, 0],
+            edge_array[:, 1]
+        )
+
+    @classmethod
+    def from_json_file(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_json(json.load(f))
+
+    def to_json(self):
+        """Serialize to the PDG service's JSON format (edge types are not kept)"""
+        return {
+            'nodes': [
+                {'id': node_id, 'code': code, 'method': method, 'line': line}
+                for node_id, code, method, line in zip(self.node_ids, self.codes, self.methods, self.lines)
+            ],
+            'edges': [[int(u), int(v), 'UNKNOWN'] for u, v in zip(self.src, self.dst)]
+        }
@@ -0,0 +1,106 @@
+"""
+PCA projection of Sent2Vec embeddings
+
+The projection is learned offline from the Sent2Vec vocabulary and stored as
+an .npz file (mean and components). The image generator applies it to every
+line embedding when EMBEDDING_PROJECTION_PATH is set. A VulCNN model trained
+on the projected embedding size is required to consume these images.
+
+Usage (from image_generator_service/):
+    python -m generator.projection --sent2vec ../models/sent2vec_model.bin \
+        --components 64 --output ../models/sent2vec_pca64.npz
+"""
+import argparse
+import os
+import numpy as np
+
+def vocabulary_embeddings(sent2vec_model, max_words=None):
+    """
+    Embeddings of the Sent2Vec vocabulary
+
+    Args:
+        sent2vec_model (sent2vec.Sent2vecModel): Loaded Sent2Vec model
+        max_words (int): Only use the most frequent max_words words
+
+    Returns:
+        numpy.ndarray: (num_words, embedding_size) matrix
+    """
+    embeddings, _ = sent2vec_model.get_unigram_embeddings()
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    if max_words:
+        embeddings = embeddings[:max_words]
+    # Words without a learned vector embed to zero and would only shift the mean
+    return embeddings[np.any(embeddings != 0, axis=1)]
+
+def fit_pca_projection(vectors, n_components):
+    """
+    Fit a PCA projection
+
+    Args:
+        vectors (numpy.ndarray): (num_samples, embedding_size) training vectors
+        n_components (int): Output dimension
+
+    Returns:
+        dict: mean, components (n_components x embedding_size) and explained_variance_ratio
+    """
+    mean = vectors.mean(axis=0)
+    _, singular_values, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+    variance = singular_values ** 2
+    return {
+        'mean': mean,
+        'components': vt[:n_components],
+        'explained_variance_ratio': variance[:n_components] / variance.sum()
+    }
+
+def save_projection(projection, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez(path, **projection)
+
+def load_projection(path):
+    """
+    Load a projection saved with save_projection
+
+    Args:
+        path (str): Path to the .npz file
+
+    Returns:
+        dict: Projection, or None if it could not be loaded
+    """
+    try:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    except Exception as e:
+        print(f"Error loading embedding projection: {str(e)}")
+        return None
+
+def apply_projection(vectors, projection):
+    """
+    Project embedding vectors
+
+    Args:
+        vectors (numpy.ndarray): (num_vectors, embedding_size) matrix
+        projection (dict): Projection from fit_pca_projection/load_projection
+
+    Returns:
+        numpy.ndarray: (num_vectors, n_components) matrix
+    """
+    return (vectors - projection['mean']) @ projection['components'].T
+
+if __name__ == '__main__':
+    from generator.sent2vec_wrapper import load_sent2vec_model
+
+    parser = argparse.ArgumentParser(description='Learn a PCA projection of Sent2Vec embeddings')
+    parser.add_argument('--sent2vec', default='../models/sent2vec_model.bin', help='Sent2Vec model path')
+    parser.add_argument('--components', type=int, default=64, help='Projected embedding size')
+    parser.add_argument('--max-words', type=int, help='Only use the most frequent words')
+    parser.add_argument('--output', required=True, help='Where to save the projection (.npz)')
+    args = parser.parse_args()
+
+    model = load_sent2vec_model(args.sent2vec)
+    if model is None:
+        raise SystemExit('Sent2Vec model could not be loaded')
+
+    projection = fit_pca_projection(vocabulary_embeddings(model, args.max_words), args.components)
+    save_projection(projection, args.output)
+    print(f"Saved {args.components}-component projection to {args.output} "
+          f"({projection['explained_variance_ratio'].sum():.1%} of variance explained)")
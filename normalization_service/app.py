@@ -1,49 +1,44 @@
 from flask import Flask, request, jsonify
 import os
-import tempfile
 import subprocess
-from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 
 # Import normalization modules
 from normalization.normalizer import normalize_source_code
 from normalization.clean_gadget import clean_gadget
+from normalization.shared_input import InputError, get_request_input, save_upload, remove_upload
 
 @app.route('/normalize', methods=['POST'])
 def normalize():
     """
     Normalize C/C++ source code
     
-    POST parameters:
+    POST parameters, either:
     - file: C/C++ source file
+    - input_path: Path of the source file on the shared data volume
+    and:
     - output_path: (Optional) Where to save the normalized file
     """
-    # Check if file was uploaded
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['file']
-    
-    # Check if filename is empty
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    try:
+        filename, source_path = get_request_input(request, 'file')
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Check file extension
     allowed_extensions = {'.c', '.cpp', '.h', '.hpp'}
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    file_ext = os.path.splitext(filename)[1].lower()
     if file_ext not in allowed_extensions:
         return jsonify({'error': 'File type not supported'}), 400
     
-    # Save the uploaded file to a temporary location
-    filename = secure_filename(file.filename)
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, filename)
-    file.save(temp_path)
+    temp_dir = None
+    if source_path is None:
+        # Save the uploaded file to a temporary location
+        source_path, temp_dir = save_upload(request.files['file'], filename)
     
     try:
         # Normalize the code
-        with open(temp_path, 'r') as f:
+        with open(source_path, 'r') as f:
             source_code = f.read()
         
         # First pass: clean up comments, string literals, etc.
@@ -75,11 +70,8 @@ def normalize():
         return jsonify({'error': str(e)}), 500
     
     finally:
-        # Clean up temporary files
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
+        # Clean up temporary files (never the by-reference input)
+        remove_upload(source_path, temp_dir)
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -1,62 +1,63 @@
 from flask import Flask, request, jsonify
 import os
-import tempfile
 import subprocess
-from werkzeug.utils import secure_filename
 
 app = Flask(__name__)
 
 # Import PDG generator modules
 from generator.pdg_generator import generate_pdg_from_file
-from generator.joern_wrapper import run_joern_analysis
+from generator.joern_wrapper import run_joern_analysis, cancel_job
+from generator.shared_input import InputError, get_request_input, save_upload, remove_upload
 
 @app.route('/generate_pdg', methods=['POST'])
 def generate_pdg():
     """
     Generate a Program Dependency Graph (PDG) from a C/C++ source file
     
-    POST parameters:
+    POST parameters, either:
     - file: Normalized C/C++ source file
+    - input_path: Path of the normalized file on the shared data volume
+    and:
     - output_path: (Optional) Where to save the generated PDG
+    - output_format: (Optional) 'dot' (default) or 'json'
+    - job_id: (Optional) Job the request belongs to, for /cancel/<job_id>
     """
-    # Check if file was uploaded
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
-    
-    file = request.files['file']
-    
-    # Check if filename is empty
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    try:
+        filename, source_path = get_request_input(request, 'file')
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Check file extension
     allowed_extensions = {'.c', '.cpp', '.h', '.hpp'}
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    file_ext = os.path.splitext(filename)[1].lower()
     if file_ext not in allowed_extensions:
         return jsonify({'error': 'File type not supported'}), 400
     
-    # Save the uploaded file to a temporary location
-    filename = secure_filename(file.filename)
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, filename)
-    file.save(temp_path)
+    temp_dir = None
+    if source_path is None:
+        # Save the uploaded file to a temporary location
+        source_path, temp_dir = save_upload(request.files['file'], filename)
     
     try:
+        output_format = request.form.get('output_format', 'dot')
+        if output_format not in ('dot', 'json'):
+            return jsonify({'error': 'Output format must be dot or json'}), 400
+        
         # Determine output path
         output_path = request.form.get('output_path')
         if not output_path:
             # Default: save to pdgs directory
             output_dir = os.environ.get('PDGS_DIR', '../data/pdgs')
             os.makedirs(output_dir, exist_ok=True)
-            output_path = os.path.join(output_dir, f"{filename}.dot")
+            output_path = os.path.join(output_dir, f"{filename}.{output_format}")
         
         # Generate PDG
-        joern_result = run_joern_analysis(temp_path)
+        joern_result = run_joern_analysis(source_path, request.form.get('job_id'))
         if not joern_result:
             return jsonify({'error': 'Joern analysis failed'}), 500
         
         # Convert Joern output to PDG
-        pdg_result = generate_pdg_from_file(joern_result, output_path)
+        pdg_result = generate_pdg_from_file(joern_result, output_path, output_format)
         if not pdg_result:
             return jsonify({'error': 'PDG generation failed'}), 500
         
@@ -69,11 +70,13 @@ def generate_pdg():
         return jsonify({'error': str(e)}), 500
     
     finally:
-        # Clean up temporary files
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
+        # Clean up temporary files (never the by-reference input)
+        remove_upload(source_path, temp_dir)
+
+@app.route('/cancel/<job_id>', methods=['POST'])
+def cancel(job_id):
+    """Kill the in-flight Joern processes of a job"""
+    return jsonify({'job_id': job_id, 'killed': cancel_job(job_id)}), 200
 
 @app.route('/health', methods=['GET'])
 def health_check():
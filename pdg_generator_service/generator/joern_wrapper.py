@@ -1,19 +1,78 @@
 import os
+import signal
 import subprocess
 import tempfile
+import threading
 import json
 import shutil
 
-def run_joern_analysis(file_path):
+# Running Joern processes by job ID, so a job's work can be killed on cancel
+_processes = {}
+_processes_lock = threading.Lock()
+
+def run_process(command, job_id=None):
+    """
+    Run a command to completion, registered under job_id while it runs
+    
+    The command gets its own process group, so cancelling also kills the
+    JVM the Joern launcher scripts start.
+    
+    Args:
+        command (list): Command and arguments
+        job_id (str): Job the process belongs to
+        
+    Returns:
+        subprocess.CompletedProcess
+    """
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True
+    )
+    with _processes_lock:
+        _processes.setdefault(job_id, set()).add(process)
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        with _processes_lock:
+            _processes[job_id].discard(process)
+            if not _processes[job_id]:
+                del _processes[job_id]
+    return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+def cancel_job(job_id):
+    """
+    Kill the running Joern processes of a job
+    
+    Args:
+        job_id (str): Job ID passed to run_joern_analysis
+        
+    Returns:
+        int: Number of processes killed
+    """
+    with _processes_lock:
+        processes = list(_processes.get(job_id, ()))
+    for process in processes:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    return len(processes)
+
+def run_joern_analysis(file_path, job_id=None):
     """
     Run Joern analysis on a C/C++ file and extract data for PDG generation
     
     Args:
         file_path (str): Path to the C/C++ file
+        job_id (str): (Optional) Job the analysis belongs to, for cancel_job
         
     Returns:
         dict: Joern analysis result or None if failed
     """
+    temp_dir = None
     try:
         # Create temporary working directory
         temp_dir = tempfile.mkdtemp()
@@ -21,12 +80,7 @@ def run_joern_analysis(file_path):
         os.makedirs(bin_dir, exist_ok=True)
         
         # Step 1: Parse file with Joern
-        process = subprocess.run(
-            ['joern-parse', file_path, '--output', bin_dir],
-            capture_output=True,
-            text=True,
-            check=True
-        )
+        process = run_process(['joern-parse', file_path, '--output', bin_dir], job_id)
         
         # Check if parsing was successful
         if process.returncode != 0:
@@ -65,11 +119,7 @@ def run_joern_analysis(file_path):
                 """)
         
         # Run Joern script to export PDG data
-        process = subprocess.run(
-            ['joern', '--script', script_path, '--params', f'cpgFile={cpg_path}'],
-            capture_output=True,
-            text=True
-        )
+        process = run_process(['joern', '--script', script_path, '--params', f'cpgFile={cpg_path}'], job_id)
         
         # Extract PDG data from output
         output = process.stdout
@@ -89,5 +139,5 @@ def run_joern_analysis(file_path):
     
     finally:
         # Clean up temporary files
-        if os.path.exists(temp_dir):
+        if temp_dir and os.path.exists(temp_dir):
             shutil.rmtree(temp_dir)
\ No newline at end of file
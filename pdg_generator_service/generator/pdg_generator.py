@@ -2,13 +2,14 @@ import networkx as nx
 import os
 import json
 
-def generate_pdg_from_file(joern_data, output_path):
+def generate_pdg_from_file(joern_data, output_path, output_format='dot'):
     """
     Generate a Program Dependency Graph (PDG) from Joern analysis data
     
     Args:
         joern_data (dict): Joern analysis result
         output_path (str): Where to save the PDG
+        output_format (str): 'dot' or 'json' (node/edge arrays read directly by the image service)
         
     Returns:
         bool: True if successful, False otherwise
@@ -57,11 +58,44 @@ def generate_pdg_from_file(joern_data, output_path):
                 edge_type = edge.get('edgeType', 'UNKNOWN')
                 combined_pdg.add_edge(str(src), str(dst), type=edge_type)
         
-        # Write PDG to DOT file
-        nx.drawing.nx_pydot.write_dot(combined_pdg, output_path)
+        if output_format == 'json':
+            write_pdg_json(combined_pdg, output_path)
+        else:
+            # Write PDG to DOT file
+            nx.drawing.nx_pydot.write_dot(combined_pdg, output_path)
         
         return True
     
     except Exception as e:
         print(f"Error generating PDG: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+def write_pdg_json(pdg, output_path):
+    """
+    Write a PDG as compact node/edge JSON
+
+    Edges reference nodes by their position in the node list, so the image
+    service can build its adjacency arrays without any graph parsing.
+
+    Args:
+        pdg (networkx.DiGraph): Program Dependency Graph
+        output_path (str): Where to save the PDG
+    """
+    index = {node: i for i, node in enumerate(pdg.nodes())}
+    data = {
+        'nodes': [
+            {
+                'id': node,
+                'code': attrs.get('code', ''),
+                'method': attrs.get('method', ''),
+                'line': attrs.get('line', -1)
+            }
+            for node, attrs in pdg.nodes(data=True)
+        ],
+        'edges': [
+            [index[src], index[dst], attrs.get('type', 'UNKNOWN')]
+            for src, dst, attrs in pdg.edges(data=True)
+        ]
+    }
+    with open(output_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
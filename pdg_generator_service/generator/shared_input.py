@@ -0,0 +1,85 @@
+"""
+Input files of pipeline service requests, uploaded or passed by reference
+
+Each service is its own build context, so this module is vendored into
+every one of them with identical contents; change all copies together.
+"""
+import os
+import tempfile
+from werkzeug.utils import secure_filename
+
+# Inputs passed by reference (input_path) must be files under SHARED_DATA_ROOT,
+# the data volume every service mounts
+SHARED_DATA_ROOT = os.path.realpath(os.environ.get('SHARED_DATA_ROOT', '../data'))
+
+class InputError(Exception):
+    """Missing or invalid input file, reported to the caller as a 400"""
+
+def resolve_input_path(path, root=None):
+    """
+    Resolve a by-reference input path
+
+    Symlinks are resolved before the check, so neither a link pointing
+    outside the root nor a sibling directory sharing its prefix (such as
+    /app/data2 for /app/data) is accepted.
+
+    Args:
+        path (str): Path sent by the caller
+        root (str): Directory the file must be in (defaults to SHARED_DATA_ROOT)
+
+    Returns:
+        str: Real path of the file, or None if it is not a file under root
+    """
+    root = os.path.realpath(root) if root else SHARED_DATA_ROOT
+    resolved = os.path.realpath(path)
+    if os.path.commonpath([resolved, root]) != root or not os.path.isfile(resolved):
+        return None
+    return resolved
+
+def get_request_input(request, field):
+    """
+    Find a request's input file
+
+    Args:
+        request: Flask request
+        field (str): Upload field, used when there is no input_path form field
+
+    Returns:
+        tuple: (filename, path) - path is the by-reference file, read in place,
+               or None for an upload, to be stored with save_upload
+
+    Raises:
+        InputError: If there is no usable input file
+    """
+    if 'input_path' in request.form:
+        path = resolve_input_path(request.form['input_path'])
+        if path is None:
+            raise InputError('input_path must be a file in the shared data directory')
+        return secure_filename(os.path.basename(path)), path
+
+    if field not in request.files:
+        raise InputError('No file part')
+    if request.files[field].filename == '':
+        raise InputError('No selected file')
+    return secure_filename(request.files[field].filename), None
+
+def save_upload(file, filename):
+    """
+    Save an uploaded file to a new temporary directory
+
+    Returns:
+        tuple: (path, temp_dir), to be removed with remove_upload
+    """
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, filename)
+    file.save(path)
+    return path, temp_dir
+
+def remove_upload(path, temp_dir):
+    """Remove a file saved by save_upload (nothing for by-reference inputs, temp_dir None)"""
+    if temp_dir is None:
+        return
+    if os.path.exists(path):
+        os.remove(path)
+    if os.path.exists(temp_dir):
+        os.rmdir(temp_dir)
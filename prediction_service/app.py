@@ -1,107 +1,348 @@
 from flask import Flask, request, jsonify
 import os
-import tempfile
 import pickle
 import numpy as np
-from werkzeug.utils import secure_filename
+from functools import partial
 
 app = Flask(__name__)
 
 # Import prediction modules
-from predictor.vulcnn import VulCNN
-from models.model import load_model
+from predictor.vulcnn import VulCNN, WindowLimitError
+from models.model import configure_threading, load_inference_model
+from models.registry import ModelRegistry, MODEL_ROLES
+from predictor.batcher import MicroBatcher, QueueFullError
+from predictor.cache import PredictionCache, model_version
+from predictor.shared_input import InputError, get_request_input, save_upload, remove_upload, resolve_input_path
 
-# Load VulCNN model at startup
-vulcnn_model = None
-@app.before_first_request
-def initialize():
-    global vulcnn_model
-    model_path = os.environ.get('VULCNN_MODEL_PATH', '../models/vulcnn_model.h5')
-    vulcnn_model = load_model(model_path)
+# Concurrent requests are grouped into one forward pass of up to
+# PREDICT_MAX_BATCH_SIZE images, waiting at most PREDICT_MAX_BATCH_LATENCY_MS.
+# PREDICT_WORKERS batches run at once; once PREDICT_MAX_QUEUE_SIZE requests
+# are waiting, new ones get 429 with a Retry-After of PREDICT_RETRY_AFTER seconds
+PREDICT_TIMEOUT = float(os.environ.get('PREDICT_TIMEOUT', 30))
+PREDICT_MAX_BATCH_SIZE = int(os.environ.get('PREDICT_MAX_BATCH_SIZE', 32))
+PREDICT_WORKERS = int(os.environ.get('PREDICT_WORKERS', 1))
+PREDICT_MAX_QUEUE_SIZE = int(os.environ.get('PREDICT_MAX_QUEUE_SIZE', 256))
+PREDICT_RETRY_AFTER = int(os.environ.get('PREDICT_RETRY_AFTER', 1))
+
+# Size TensorFlow's thread pools (TF_INTRA_OP_THREADS, TF_INTER_OP_THREADS)
+# before the model is loaded
+configure_threading()
+
+# Load VulCNN model in the background at startup (warming the compiled
+# inference function up at the batch sizes it will serve); requests wait
+# for it for up to MODEL_WAIT_TIMEOUT seconds. Later versions are loaded
+# and swapped in through the /models endpoints, from files in VULCNN_MODEL_DIR
+MODEL_WAIT_TIMEOUT = float(os.environ.get('MODEL_WAIT_TIMEOUT', 60))
+VULCNN_MODEL_PATH = os.environ.get('VULCNN_MODEL_PATH', '../models/vulcnn_model.h5')
+VULCNN_MODEL_DIR = os.path.realpath(os.environ.get('VULCNN_MODEL_DIR', os.path.dirname(VULCNN_MODEL_PATH)))
+
+model_registry = ModelRegistry(
+    lambda path: load_inference_model(path, warmup_batch_sizes=(1, PREDICT_MAX_BATCH_SIZE)),
+    model_version,
+    name='VulCNN',
+    shadow_sample_rate=float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1))
+)
+model_registry.load(VULCNN_MODEL_PATH)
+
+batcher = MicroBatcher(
+    lambda batch: model_registry.model.predict(batch, verbose=0),
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    max_latency_ms=float(os.environ.get('PREDICT_MAX_BATCH_LATENCY_MS', 5)),
+    max_queue_size=PREDICT_MAX_QUEUE_SIZE,
+    num_workers=PREDICT_WORKERS
+)
+batcher.start()
+
+# Model outputs are cached by image tensor and model version, up to
+# PREDICTION_CACHE_SIZE entries in memory (0 disables the cache) and
+# optionally in PREDICTION_CACHE_DIR
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))
+prediction_cache = PredictionCache(
+    PREDICTION_CACHE_SIZE, os.environ.get('PREDICTION_CACHE_DIR') or None
+) if PREDICTION_CACHE_SIZE > 0 else None
+
+# How much of each image the model sees:
+# - prefix: only the first max_len rows (one forward pass per image)
+# - window: max_len-row windows slid over the whole image every PREDICTION_WINDOW_STRIDE rows;
+#   a window's score goes to every function in it, so this is not per-function attribution
+# - function: windows over the rows of each function separately (per-function attribution)
+PREDICTION_MODES = ('prefix', 'window', 'function')
+PREDICTION_MODE = os.environ.get('PREDICTION_MODE', 'prefix')
+PREDICTION_WINDOW_STRIDE = int(os.environ.get('PREDICTION_WINDOW_STRIDE', 50))
+
+# Window and function mode run every window of a request in one forward pass;
+# a file needing more than PREDICTION_MAX_WINDOWS_PER_FILE windows fails, and a
+# request needing more than PREDICTION_MAX_WINDOWS_PER_REQUEST gets 413
+PREDICTION_MAX_WINDOWS_PER_FILE = int(os.environ.get('PREDICTION_MAX_WINDOWS_PER_FILE', 128))
+PREDICTION_MAX_WINDOWS_PER_REQUEST = int(os.environ.get('PREDICTION_MAX_WINDOWS_PER_REQUEST', 512))
 
 @app.route('/predict', methods=['POST'])
 def predict():
     """
     Predict vulnerabilities from an image representation
     
-    POST parameters:
+    POST parameters, either:
     - image_file: Image representation file (.pkl)
+    - input_path: Path of the image representation on the shared data volume
+    and:
     - file_id: (Optional) ID of the original source file
+    - mode: (Optional) prefix, window or function (defaults to PREDICTION_MODE)
     """
-    global vulcnn_model
-    
-    # Check if model is loaded
+    # Wait for the model if it is still loading
+    vulcnn_model = model_registry.wait(MODEL_WAIT_TIMEOUT)
     if vulcnn_model is None:
-        return jsonify({'error': 'VulCNN model not initialized'}), 500
-    
-    # Check if file was uploaded
-    if 'image_file' not in request.files:
-        return jsonify({'error': 'No file part'}), 400
+        return jsonify({'error': 'VulCNN model not ready', 'model': model_registry.status()}), 503
     
-    file = request.files['image_file']
-    
-    # Check if filename is empty
-    if file.filename == '':
-        return jsonify({'error': 'No selected file'}), 400
+    try:
+        filename, image_path = get_request_input(request, 'image_file')
+    except InputError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Check file extension
-    if not file.filename.endswith('.pkl'):
+    if not filename.endswith('.pkl'):
         return jsonify({'error': 'File must be a pickle file'}), 400
     
-    # Save the uploaded file to a temporary location
-    filename = secure_filename(file.filename)
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, filename)
-    file.save(temp_path)
+    mode = request.form.get('mode', PREDICTION_MODE)
+    if mode not in PREDICTION_MODES:
+        return jsonify({'error': f"Mode must be one of {', '.join(PREDICTION_MODES)}"}), 400
+    
+    temp_dir = None
+    if image_path is None:
+        # Save the uploaded file to a temporary location
+        image_path, temp_dir = save_upload(request.files['image_file'], filename)
     
     try:
         # Load the image representation from the pickle file
-        with open(temp_path, 'rb') as f:
+        with open(image_path, 'rb') as f:
             image_data = pickle.load(f)
         
         # Get file_id from request if available
         file_id = request.form.get('file_id')
         
-        # Run prediction
+        # Run prediction as part of the next micro-batch
         predictor = VulCNN(vulcnn_model)
-        result = predictor.predict(image_data)
+        results = predictor.predict_images(
+            [image_data], run_model, mode, PREDICTION_WINDOW_STRIDE,
+            PREDICTION_MAX_WINDOWS_PER_FILE, PREDICTION_MAX_WINDOWS_PER_REQUEST
+        )[0]
+        if isinstance(results, Exception):
+            raise results
         
-        # Process prediction result
+        # Process prediction results
         vulnerabilities = []
-        if result['is_vulnerable']:
-            # Get vulnerability details
-            vuln_type = result.get('vulnerability_type', 'Unknown')
-            
-            # Map to standard vulnerability types based on prediction
-            vuln_info = map_vulnerability_type(vuln_type)
-            
-            # Add additional information
-            vulnerability = {
-                'file_id': file_id,
-                'function_name': result.get('function_name', 'Unknown'),
-                'line_number': result.get('line_number', 0),
-                'severity': vuln_info.get('severity', 'medium'),
-                'type': vuln_info.get('type', 'Unknown'),
-                'cwe_id': vuln_info.get('cwe_id', 'CWE-0'),
-                'description': vuln_info.get('description', 'Potential vulnerability detected'),
-                'confidence_score': result.get('confidence', 0.5)
-            }
-            vulnerabilities.append(vulnerability)
+        for result in results:
+            vulnerabilities.extend(build_vulnerabilities(result, file_id))
         
         return jsonify({
-            'is_vulnerable': result['is_vulnerable'],
+            'is_vulnerable': any(result['is_vulnerable'] for result in results),
             'vulnerabilities': vulnerabilities
         }), 200
     
+    except WindowLimitError as e:
+        return jsonify({'error': str(e)}), 413
+    
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': str(PREDICT_RETRY_AFTER)}
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
     finally:
-        # Clean up temporary files
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-        if os.path.exists(temp_dir):
-            os.rmdir(temp_dir)
+        # Clean up temporary files (never the by-reference input)
+        remove_upload(image_path, temp_dir)
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Predict vulnerabilities for many image representations in one forward pass
+    
+    POST parameters, either:
+    - image_files: Image representation files (.pkl), one per source file
+    - images: A single .npy array of preprocessed images, shape (n, 3, max_len, hidden_size)
+    - image_paths: Paths of image representations (.pkl) on the shared data volume
+    and:
+    - file_ids: (Optional) IDs of the original source files, in the same order
+    - mode: (Optional) prefix, window or function for .pkl files (defaults to PREDICTION_MODE)
+    
+    A .pkl file that cannot be loaded or preprocessed, or that needs more than
+    PREDICTION_MAX_WINDOWS_PER_FILE windows, gets a {'file_id', 'error'} result
+    instead of failing the other files of the request.
+    """
+    # Wait for the model if it is still loading
+    vulcnn_model = model_registry.wait(MODEL_WAIT_TIMEOUT)
+    if vulcnn_model is None:
+        return jsonify({'error': 'VulCNN model not ready', 'model': model_registry.status()}), 503
+    
+    predictor = VulCNN(vulcnn_model)
+    
+    mode = request.form.get('mode', PREDICTION_MODE)
+    if mode not in PREDICTION_MODES:
+        return jsonify({'error': f"Mode must be one of {', '.join(PREDICTION_MODES)}"}), 400
+    
+    try:
+        if 'images' in request.files:
+            # Already preprocessed and stacked by the caller
+            processed = np.load(request.files['images'].stream, allow_pickle=False).astype(np.float32)
+            expected = (3, predictor.max_len, predictor.hidden_size)
+            if processed.ndim != 4 or processed.shape[1:] != expected:
+                return jsonify({'error': f'Images must have shape (n, {expected[0]}, {expected[1]}, {expected[2]})'}), 400
+            
+            num_images = len(processed)
+            if num_images:
+                # One submission, so the whole request runs in a single forward pass
+                probabilities = run_model(processed)
+                image_results = [[predictor.interpret(row)] for row in probabilities]
+        elif 'image_paths' in request.form:
+            # Read in place, no uploads
+            image_paths = request.form.getlist('image_paths')
+            num_images = len(image_paths)
+            image_results = predict_pickles(predictor, [partial(load_pickle_path, path) for path in image_paths], mode)
+        else:
+            files = request.files.getlist('image_files')
+            if not files:
+                return jsonify({'error': 'No file part'}), 400
+            if any(not file.filename.endswith('.pkl') for file in files):
+                return jsonify({'error': 'Files must be pickle files'}), 400
+            
+            # Read the pickles straight from the request, no temporary files
+            num_images = len(files)
+            image_results = predict_pickles(predictor, [partial(pickle.load, file.stream) for file in files], mode)
+        
+        file_ids = request.form.getlist('file_ids')
+        if file_ids and len(file_ids) != num_images:
+            return jsonify({'error': 'Number of file_ids does not match number of images'}), 400
+        if not num_images:
+            return jsonify({'results': []}), 200
+        if not file_ids:
+            file_ids = [None] * num_images
+        
+        results = []
+        for file_id, file_results in zip(file_ids, image_results):
+            if isinstance(file_results, Exception):
+                results.append({'file_id': file_id, 'error': str(file_results)})
+                continue
+            vulnerabilities = []
+            for result in file_results:
+                vulnerabilities.extend(build_vulnerabilities(result, file_id))
+            results.append({
+                'file_id': file_id,
+                'is_vulnerable': any(result['is_vulnerable'] for result in file_results),
+                'vulnerabilities': vulnerabilities
+            })
+        
+        return jsonify({'results': results}), 200
+    
+    except WindowLimitError as e:
+        return jsonify({'error': str(e)}), 413
+    
+    except QueueFullError as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': str(PREDICT_RETRY_AFTER)}
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def load_pickle_path(path):
+    """Load a by-reference image representation"""
+    resolved = resolve_input_path(path)
+    if resolved is None or not resolved.endswith('.pkl'):
+        raise ValueError('Path must be a pickle file in the shared data directory')
+    with open(resolved, 'rb') as f:
+        return pickle.load(f)
+
+def predict_pickles(predictor, loaders, mode):
+    """
+    Load and predict pickled image representations, isolating failures per file
+    
+    Args:
+        predictor (VulCNN): Predictor for the loaded model
+        loaders (list): Functions returning each image representation
+        mode (str): prefix, window or function
+        
+    Returns:
+        list: For each file, its prediction results (see VulCNN.predict_images)
+              or the exception raised loading or preprocessing it
+        
+    Raises:
+        WindowLimitError: If the files need more than PREDICTION_MAX_WINDOWS_PER_REQUEST windows
+    """
+    results = [None] * len(loaders)
+    images = []
+    indices = []
+    for i, load in enumerate(loaders):
+        try:
+            images.append(load())
+            indices.append(i)
+        except Exception as e:
+            results[i] = ValueError(f"Could not load image representation: {e}")
+    
+    if images:
+        predicted = predictor.predict_images(
+            images, run_model, mode, PREDICTION_WINDOW_STRIDE,
+            PREDICTION_MAX_WINDOWS_PER_FILE, PREDICTION_MAX_WINDOWS_PER_REQUEST
+        )
+        for i, image_results in zip(indices, predicted):
+            results[i] = image_results
+    return results
+
+def run_model(batch):
+    """
+    Model output for preprocessed images, reusing cached outputs for tensors seen before
+    
+    Only the images missing from the cache go through the batcher.
+    
+    Args:
+        batch (numpy.ndarray): (n, 3, max_len, hidden_size) preprocessed images
+        
+    Returns:
+        numpy.ndarray: (n, 2) class probabilities
+    """
+    version = model_registry.active_version
+    if prediction_cache is None or version is None or not len(batch):
+        outputs = batcher.predict(batch, timeout=PREDICT_TIMEOUT)
+        model_registry.shadow(batch, outputs)
+        return outputs
+    
+    keys = [prediction_cache.key(image, version) for image in batch]
+    outputs = [prediction_cache.get(key) for key in keys]
+    misses = [i for i, output in enumerate(outputs) if output is None]
+    if misses:
+        computed = batcher.predict(batch[misses], timeout=PREDICT_TIMEOUT)
+        # Outputs computed across a model swap may come from the new version
+        store = model_registry.active_version == version
+        for i, output in zip(misses, computed):
+            if store:
+                prediction_cache.put(keys[i], output)
+            outputs[i] = output
+    outputs = np.stack(outputs)
+    model_registry.shadow(batch, outputs)
+    return outputs
+
+def build_vulnerabilities(result, file_id):
+    """Build the vulnerability list for a prediction result"""
+    vulnerabilities = []
+    if result['is_vulnerable']:
+        # Get vulnerability details
+        vuln_type = result.get('vulnerability_type', 'Unknown')
+        
+        # Map to standard vulnerability types based on prediction
+        vuln_info = map_vulnerability_type(vuln_type)
+        
+        # Add additional information
+        vulnerability = {
+            'file_id': file_id,
+            'function_name': result.get('function_name', 'Unknown'),
+            'line_number': result.get('line_number', 0),
+            'severity': vuln_info.get('severity', 'medium'),
+            'type': vuln_info.get('type', 'Unknown'),
+            'cwe_id': vuln_info.get('cwe_id', 'CWE-0'),
+            'description': vuln_info.get('description', 'Potential vulnerability detected'),
+            'confidence_score': result.get('confidence', 0.5)
+        }
+        if result.get('line_range'):
+            vulnerability['line_range'] = result['line_range']
+        vulnerabilities.append(vulnerability)
+    
+    return vulnerabilities
 
 def map_vulnerability_type(vuln_type):
     """Map predicted vulnerability type to standard information"""
@@ -143,9 +384,77 @@ def map_vulnerability_type(vuln_type):
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Simple health check endpoint"""
-    status = 'ok' if vulcnn_model is not None else 'model not loaded'
-    return jsonify({'status': status}), 200
+    """Liveness check: the process is up, whether or not the model is loaded"""
+    return jsonify({'status': 'ok', 'model': model_registry.state}), 200
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """Readiness check: only ready once the VulCNN model is loaded"""
+    status = model_registry.status()
+    return jsonify(status), 200 if model_registry.is_ready else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Model versions, shadow evaluation, batching and prediction cache metrics"""
+    return jsonify({
+        'models': model_registry.status(),
+        'model_version': model_registry.active_version,
+        'batching': batcher.stats(),
+        'prediction_cache': prediction_cache.stats() if prediction_cache is not None else {'enabled': False}
+    }), 200
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """Active, previous and shadow model versions, loads in progress and shadow metrics"""
+    return jsonify(model_registry.status()), 200
+
+@app.route('/models/load', methods=['POST'])
+def load_model_version():
+    """
+    Load a model version in the background
+    
+    POST parameters:
+    - model_path: Model file, relative to VULCNN_MODEL_DIR or absolute inside it
+    - role: (Optional) active (swap in once loaded, default) or shadow
+    """
+    params = request.get_json(silent=True) or request.form
+    model_path = params.get('model_path')
+    role = params.get('role', 'active')
+    if not model_path:
+        return jsonify({'error': 'model_path is required'}), 400
+    if role not in MODEL_ROLES:
+        return jsonify({'error': f"Role must be one of {', '.join(MODEL_ROLES)}"}), 400
+    
+    model_path = os.path.realpath(os.path.join(VULCNN_MODEL_DIR, model_path))
+    if os.path.commonpath([model_path, VULCNN_MODEL_DIR]) != VULCNN_MODEL_DIR:
+        return jsonify({'error': 'model_path must be inside the model directory'}), 400
+    if not os.path.exists(model_path):
+        return jsonify({'error': 'Model file not found'}), 404
+    
+    loader = model_registry.load(model_path, role)
+    return jsonify(dict(loader.status(), role=role)), 202
+
+@app.route('/models/activate', methods=['POST'])
+def activate_model_version():
+    """
+    Swap in an already loaded version (promote the shadow, or roll back to the previous one)
+    
+    POST parameters:
+    - version: Version identifier from GET /models
+    """
+    params = request.get_json(silent=True) or request.form
+    version = params.get('version')
+    try:
+        model_registry.activate(version)
+    except KeyError:
+        return jsonify({'error': 'Model version not loaded'}), 404
+    return jsonify(model_registry.status()), 200
+
+@app.route('/models/shadow', methods=['DELETE'])
+def clear_shadow_model():
+    """Stop shadowing and unload the shadow version"""
+    model_registry.clear_shadow()
+    return jsonify(model_registry.status()), 200
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5004)
\ No newline at end of file
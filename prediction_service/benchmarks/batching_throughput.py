@@ -0,0 +1,89 @@
+"""
+Throughput benchmark: per-request predict vs micro-batching
+
+Runs the same random images through model.predict one request at a time and
+through a MicroBatcher, with 1, 8 and 64 concurrent clients by default.
+
+Usage (from prediction_service/):
+    python -m benchmarks.batching_throughput --model ../models/vulcnn_model.h5
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import numpy as np
+
+from models.model import load_model
+from predictor.batcher import MicroBatcher
+from predictor.vulcnn import VulCNN
+
+def run_clients(predict, images, clients, requests_per_client):
+    """
+    Run concurrent clients that each send requests_per_client single images
+
+    Returns:
+        dict: Throughput and latency percentiles
+    """
+    latencies = []
+    lock = threading.Lock()
+
+    def client(seed):
+        local = []
+        for i in range(requests_per_client):
+            image = images[(seed + i) % len(images)]
+            start = time.perf_counter()
+            predict(image)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client, args=(seed,)) for seed in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-batching throughput benchmark')
+    parser.add_argument('--model', default='../models/vulcnn_model.h5', help='VulCNN model path')
+    parser.add_argument('--clients', nargs='+', type=int, default=[1, 8, 64])
+    parser.add_argument('--requests', type=int, default=50, help='Requests per client')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    if model is None:
+        raise SystemExit('VulCNN model could not be loaded')
+
+    predictor = VulCNN(model)
+    rng = np.random.default_rng(0)
+    images = [
+        predictor.preprocess_image([rng.standard_normal((80, predictor.hidden_size)) for _ in range(3)])
+        for _ in range(16)
+    ]
+
+    batcher = MicroBatcher(lambda batch: model.predict(batch, verbose=0),
+                           args.max_batch_size, args.max_latency_ms)
+    batcher.start()
+
+    report = []
+    for clients in args.clients:
+        report.append({
+            'clients': clients,
+            'per_request': run_clients(lambda image: model.predict(image, verbose=0),
+                                       images, clients, args.requests),
+            'micro_batched': run_clients(batcher.predict, images, clients, args.requests)
+        })
+
+    print(json.dumps({'results': report, 'batching': batcher.stats()}, indent=2))
@@ -0,0 +1,63 @@
+"""
+CPU throughput benchmark: original VulCNN branches vs the fused convolution
+
+Both models are served through the compiled inference function. The check
+fails if the fused model's probabilities differ from the original beyond
+float32 rounding.
+
+Usage (from prediction_service/):
+    python -m benchmarks.fused_throughput --model ../models/vulcnn_model.h5
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from models.fused import fuse_vulcnn_model
+from models.model import CompiledModel, load_model
+
+def images_per_second(model, images, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        model.predict(images)
+    return len(images) * repeat / (time.perf_counter() - start)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Original vs fused VulCNN CPU throughput')
+    parser.add_argument('--model', default='../models/vulcnn_model.h5', help='VulCNN model path')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--atol', type=float, default=1e-5, help='Allowed probability difference')
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    if model is None:
+        raise SystemExit('VulCNN model could not be loaded')
+
+    original = CompiledModel(model)
+    fused = CompiledModel(fuse_vulcnn_model(model))
+    original.warmup(args.batch_sizes)
+    fused.warmup(args.batch_sizes)
+
+    rng = np.random.default_rng(0)
+    report = []
+    for batch_size in args.batch_sizes:
+        # Non-negative inputs with trailing zero rows, like real images
+        images = np.abs(rng.standard_normal((batch_size,) + tuple(model.input_shape[1:]))).astype(np.float32)
+        images[:, :, images.shape[2] // 2:] = 0
+
+        difference = float(np.max(np.abs(original.predict(images) - fused.predict(images))))
+        if difference > args.atol:
+            raise SystemExit(f'Fused model differs from the original by {difference} at batch size {batch_size}')
+
+        original_ips = images_per_second(original, images, args.repeat)
+        fused_ips = images_per_second(fused, images, args.repeat)
+        report.append({
+            'batch_size': batch_size,
+            'original_images_per_second': original_ips,
+            'fused_images_per_second': fused_ips,
+            'speedup': fused_ips / original_ips,
+            'max_abs_difference': difference
+        })
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,57 @@
+"""
+Latency benchmark: Keras model.predict vs the compiled inference function
+
+Usage (from prediction_service/):
+    python -m benchmarks.inference_latency --model ../models/vulcnn_model.h5
+"""
+import argparse
+import json
+import statistics
+import time
+import numpy as np
+
+from models.model import CompiledModel, load_model
+
+def measure(predict, images, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        predict(images)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings) * 1000,
+        'p95_ms': timings[int(len(timings) * 0.95) - 1] * 1000
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keras predict vs compiled inference latency')
+    parser.add_argument('--model', default='../models/vulcnn_model.h5', help='VulCNN model path')
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[1, 8, 32])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    if model is None:
+        raise SystemExit('VulCNN model could not be loaded')
+
+    compiled = CompiledModel(model)
+    compiled.warmup(args.batch_sizes)
+
+    rng = np.random.default_rng(0)
+    report = []
+    for batch_size in args.batch_sizes:
+        images = rng.standard_normal((batch_size,) + tuple(model.input_shape[1:])).astype(np.float32)
+        # Warm the Keras path up as well so both are measured in steady state
+        model.predict(images, verbose=0)
+
+        keras_output = model.predict(images, verbose=0)
+        compiled_output = compiled.predict(images)
+        report.append({
+            'batch_size': batch_size,
+            'keras_predict': measure(lambda x: model.predict(x, verbose=0), images, args.repeat),
+            'compiled': measure(compiled.predict, images, args.repeat),
+            'max_abs_difference': float(np.max(np.abs(keras_output - compiled_output)))
+        })
+
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,68 @@
+"""
+Microbenchmark and equivalence check for image preprocessing
+
+Compares the original per-row Python loop against the vectorized
+preprocessing (fresh array per image, and a batch into a reused buffer),
+and checks that all of them produce the same model input.
+
+Usage (from prediction_service/):
+    python -m benchmarks.preprocess_benchmark
+"""
+import argparse
+import json
+import timeit
+import numpy as np
+
+from predictor.vulcnn import VulCNN
+
+def legacy_preprocess(image_data, max_len=100, hidden_size=128):
+    """The original preprocess_image implementation"""
+    degree_channel, closeness_channel, katz_channel = image_data
+    vectors = np.zeros(shape=(3, max_len, hidden_size))
+    for j, channel in enumerate([degree_channel, closeness_channel, katz_channel]):
+        for i in range(min(len(channel), max_len)):
+            vectors[j][i] = channel[i]
+    return np.expand_dims(vectors, axis=0)
+
+def sample_images(count, rng, hidden_size=128):
+    """Images of varied length, both as lists of vectors and as 2D arrays"""
+    images = []
+    for i in range(count):
+        rows = int(rng.integers(1, 300))
+        channels = [rng.standard_normal((rows, hidden_size)) for _ in range(3)]
+        if i % 2:
+            channels = [list(channel) for channel in channels]
+        images.append(tuple(channels))
+    return images
+
+def check_equivalence(predictor, images):
+    """Raise AssertionError if the vectorized output differs from the legacy output"""
+    batch = predictor.preprocess_batch(images, out=predictor.input_buffer(len(images)))
+    for image_data, row in zip(images, batch):
+        expected = legacy_preprocess(image_data).astype(np.float32)
+        np.testing.assert_array_equal(predictor.preprocess_image(image_data), expected)
+        np.testing.assert_array_equal(row[None], expected)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Image preprocessing microbenchmark')
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    predictor = VulCNN(None)
+    images = sample_images(args.images, np.random.default_rng(0))
+    check_equivalence(predictor, images)
+
+    buffer = predictor.input_buffer(len(images))
+    timings = {
+        'legacy_loop': lambda: [legacy_preprocess(image) for image in images],
+        'vectorized_per_image': lambda: [predictor.preprocess_image(image) for image in images],
+        'vectorized_batch_reused_buffer': lambda: predictor.preprocess_batch(images, out=buffer)
+    }
+
+    report = {'images': len(images), 'equivalent': True}
+    for name, fn in timings.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        report[f"{name}_ms_per_image"] = best * 1000 / len(images)
+
+    print(json.dumps(report, indent=2))
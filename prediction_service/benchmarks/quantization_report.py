@@ -0,0 +1,89 @@
+"""
+Accuracy vs latency report for quantized VulCNN models
+
+Evaluates the float Keras model and one or more TFLite variants on a
+held-out set of image representations.
+
+Usage (from prediction_service/):
+    python -m benchmarks.quantization_report --model ../models/vulcnn_model.h5 \
+        --tflite ../models/vulcnn_model_fp16.tflite ../models/vulcnn_model_int8.tflite \
+        --manifest heldout.csv
+
+The manifest is a CSV file with the columns image_path,label where
+image_path is an image representation (.pkl) and label is 1 for vulnerable
+and 0 for safe.
+"""
+import argparse
+import csv
+import json
+import os
+import pickle
+import statistics
+import time
+import numpy as np
+
+from models.model import CompiledModel, load_model
+from models.quantization import load_tflite_model
+from predictor.vulcnn import VulCNN
+
+def load_heldout(manifest, predictor):
+    with open(manifest, newline='') as f:
+        samples = list(csv.DictReader(f))
+    images = []
+    for sample in samples:
+        with open(sample['image_path'], 'rb') as f:
+            images.append(pickle.load(f))
+    labels = np.array([int(sample['label']) for sample in samples])
+    return predictor.preprocess_batch(images), labels
+
+def latency_ms(model, images, batch_size, repeat=30):
+    batch = images[:batch_size]
+    model.predict(batch, verbose=0)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.predict(batch, verbose=0)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def evaluate(model, images, labels, reference=None, batch_sizes=(1, 32)):
+    probabilities = np.concatenate([
+        model.predict(images[i:i + 256], verbose=0) for i in range(0, len(images), 256)
+    ])
+    predictions = probabilities[:, 1] > 0.5
+    result = {
+        'accuracy': float(np.mean(predictions == labels.astype(bool))),
+        'latency_ms': {str(size): latency_ms(model, images, size) for size in batch_sizes if size <= len(images)}
+    }
+    if reference is not None:
+        result['agreement_with_float'] = float(np.mean(predictions == (reference[:, 1] > 0.5)))
+        result['max_probability_difference'] = float(np.max(np.abs(probabilities - reference)))
+    return result, probabilities
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantized model accuracy vs latency report')
+    parser.add_argument('--model', default='../models/vulcnn_model.h5', help='Float Keras model')
+    parser.add_argument('--tflite', nargs='+', required=True, help='Quantized .tflite models')
+    parser.add_argument('--manifest', required=True, help='CSV file with image_path,label columns')
+    parser.add_argument('--num-threads', type=int, help='TFLite interpreter threads')
+    args = parser.parse_args()
+
+    float_model = load_model(args.model)
+    if float_model is None:
+        raise SystemExit('VulCNN model could not be loaded')
+    float_model = CompiledModel(float_model)
+
+    images, labels = load_heldout(args.manifest, VulCNN(float_model))
+    report = {'samples': len(labels)}
+
+    report['float'], reference = evaluate(float_model, images, labels)
+    report['float']['size_kib'] = os.path.getsize(args.model) / 1024
+
+    for path in args.tflite:
+        model = load_tflite_model(path, args.num_threads)
+        if model is None:
+            continue
+        report[os.path.basename(path)], _ = evaluate(model, images, labels, reference)
+        report[os.path.basename(path)]['size_kib'] = os.path.getsize(path) / 1024
+
+    print(json.dumps(report, indent=2))
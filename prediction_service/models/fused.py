@@ -0,0 +1,105 @@
+"""
+Fused inference architecture for VulCNN
+
+create_vulcnn_model builds ten Conv2D branches (filter heights 1-10) that
+each scan the same input. With channels_first images, each branch's
+MaxPool1D pools over its 32 filters, so the branch gives one feature per
+output row (101 - h features for height h on 100-row images, 955 in all).
+For inference the ten kernels can be stacked into one: every kernel is
+zero-padded to the tallest height and the input is zero-padded by the same
+amount at the bottom. Each branch then takes its filters and the rows it
+would have produced from the one convolution. The result is one
+convolution instead of ten with the same output as the original model.
+"""
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+class FusedTextConv(keras.layers.Layer):
+    """
+    One convolution computing all VulCNN branches, followed by each branch's max over its filters
+
+    Output features are in the same order as the Flatten and Concatenate
+    of the original branches: branch by branch, row by row.
+    """
+
+    def __init__(self, kernel, bias, branches, channels_first, **kwargs):
+        """
+        Args:
+            kernel (numpy.ndarray): (max_height, width, in_channels, total_filters) stacked kernels
+            bias (numpy.ndarray): (total_filters,) stacked biases
+            branches (list): (kernel height, number of filters) of each branch, in kernel order
+            channels_first (bool): Whether inputs are (batch, channels, height, width)
+        """
+        super().__init__(trainable=False, **kwargs)
+        self.kernel = tf.constant(kernel, dtype=tf.float32)
+        self.bias = tf.constant(bias, dtype=tf.float32)
+        self.branches = [(int(height), int(filters)) for height, filters in branches]
+        self.max_height = int(kernel.shape[0])
+        self.channels_first = channels_first
+
+    def call(self, inputs):
+        # TensorFlow's CPU convolution only supports channels-last
+        x = tf.transpose(inputs, [0, 2, 3, 1]) if self.channels_first else inputs
+        height = x.shape[1]
+
+        # Pad so every kernel height yields one output per input row; the
+        # full-width kernels leave a single column
+        x = tf.pad(x, [[0, 0], [0, self.max_height - 1], [0, 0], [0, 0]])
+        y = tf.nn.relu(tf.nn.conv2d(x, self.kernel, strides=1, padding='VALID') + self.bias)[:, :, 0, :]
+
+        # A branch of height h produces rows 0 .. height - h
+        features = []
+        start = 0
+        for branch_height, filters in self.branches:
+            features.append(tf.reduce_max(y[:, :height - branch_height + 1, start:start + filters], axis=2))
+            start += filters
+        return tf.concat(features, axis=1)
+
+def fuse_vulcnn_model(model):
+    """
+    Build the fused inference model from a trained VulCNN model
+
+    Args:
+        model (keras.Model): Model with the create_vulcnn_model architecture
+
+    Returns:
+        keras.Model: Fused model with the same input and output as model
+
+    Raises:
+        ValueError: If the model does not have the VulCNN branches, or its
+                    output layer does not take the features the fused
+                    convolution computes
+    """
+    conv_layers = [layer for layer in model.layers if isinstance(layer, keras.layers.Conv2D)]
+    dense_layers = [layer for layer in model.layers if isinstance(layer, keras.layers.Dense)]
+    if not conv_layers or not dense_layers:
+        raise ValueError("Model does not have the VulCNN convolution branches")
+
+    channels_first = conv_layers[0].data_format == 'channels_first'
+    height, width = model.input_shape[2:4] if channels_first else model.input_shape[1:3]
+    kernels = [layer.get_weights()[0] for layer in conv_layers]
+    biases = [layer.get_weights()[1] for layer in conv_layers]
+    if any(kernel.shape[1] != width for kernel in kernels):
+        raise ValueError("VulCNN kernels must span the full image width")
+    max_height = max(kernel.shape[0] for kernel in kernels)
+
+    fused_kernel = np.concatenate([
+        np.pad(kernel, [(0, max_height - kernel.shape[0]), (0, 0), (0, 0), (0, 0)])
+        for kernel in kernels
+    ], axis=3)
+    branches = [(kernel.shape[0], kernel.shape[3]) for kernel in kernels]
+
+    output_layer = dense_layers[-1]
+    num_features = sum(height - branch_height + 1 for branch_height, _ in branches)
+    expected = output_layer.get_weights()[0].shape[0]
+    if num_features != expected:
+        raise ValueError(f"Fused convolution gives {num_features} features, the output layer takes {expected}")
+
+    inputs = keras.layers.Input(shape=model.input_shape[1:])
+    features = FusedTextConv(fused_kernel, np.concatenate(biases), branches, channels_first)(inputs)
+    outputs = keras.layers.Dense(output_layer.units, activation=output_layer.activation)(features)
+
+    fused = keras.Model(inputs=inputs, outputs=outputs)
+    fused.layers[-1].set_weights(output_layer.get_weights())
+    return fused
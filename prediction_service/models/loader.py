@@ -0,0 +1,118 @@
+"""
+Background model loading with readiness state
+
+Each service is its own build context, so this module is vendored into
+prediction_service/models/loader.py and
+image_generator_service/generator/model_loader.py with identical contents;
+change both copies together.
+"""
+import threading
+import time
+
+class BackgroundModelLoader:
+    """
+    Loads a model in a background thread at process start
+
+    Requests that arrive while the model is loading wait for it (up to a
+    timeout) instead of failing, and the loader state backs the service's
+    readiness endpoint so traffic is only routed to warm workers.
+    """
+
+    def __init__(self, load_fn, model_path, name='model', on_load=None):
+        """
+        Args:
+            load_fn: Function taking a model path and returning the model (None on failure)
+            model_path (str): Path passed to load_fn
+            name (str): Model name used in log messages
+            on_load: Optional function called with this loader once the model
+                     has loaded, before waiting requests are released
+        """
+        self.load_fn = load_fn
+        self.on_load = on_load
+        self.model_path = model_path
+        self.name = name
+        self.model = None
+        self.state = 'pending'
+        self.error = None
+        self.started_at = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.waiting_requests = 0
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start loading the model in a daemon thread (no-op if already started)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.state = 'loading'
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._load, name=f"{self.name}-loader", daemon=True)
+            self._thread.start()
+
+    def _load(self):
+        start = time.perf_counter()
+        try:
+            model = self.load_fn(self.model_path)
+            if model is None:
+                self.error = f"Failed to load {self.name} from {self.model_path}"
+        except Exception as e:
+            model = None
+            self.error = str(e)
+
+        self.load_seconds = time.perf_counter() - start
+        self.loaded_at = time.time()
+        self.model = model
+        if model is not None and self.on_load is not None:
+            try:
+                self.on_load(self)
+            except Exception as e:
+                self.model = model = None
+                self.error = str(e)
+        self.state = 'ready' if model is not None else 'failed'
+        print(f"{self.name} loader finished in {self.load_seconds:.1f}s with state {self.state}")
+        self._ready.set()
+
+    @property
+    def is_ready(self):
+        return self.state == 'ready'
+
+    def wait(self, timeout=None):
+        """
+        Wait for the model to finish loading
+
+        Args:
+            timeout (float): Maximum seconds to wait
+
+        Returns:
+            The loaded model, or None if loading failed or timed out
+        """
+        if not self._ready.is_set():
+            with self._lock:
+                self.waiting_requests += 1
+            try:
+                self._ready.wait(timeout)
+            finally:
+                with self._lock:
+                    self.waiting_requests -= 1
+        return self.model
+
+    def status(self):
+        """
+        Loader state and load-time metrics
+
+        Returns:
+            dict: State, timings, error and number of requests waiting on the load
+        """
+        return {
+            'name': self.name,
+            'state': self.state,
+            'model_path': self.model_path,
+            'started_at': self.started_at,
+            'loaded_at': self.loaded_at,
+            'load_seconds': self.load_seconds,
+            'error': self.error,
+            'waiting_requests': self.waiting_requests
+        }
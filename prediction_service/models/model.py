@@ -1,7 +1,41 @@
 import os
+import numpy as np
 import tensorflow as tf
 from tensorflow import keras
 
+# 'compiled' serves a fixed-signature tf.function, 'keras' calls model.predict
+INFERENCE_MODE = os.environ.get('VULCNN_INFERENCE_MODE', 'compiled')
+
+# 'keras' loads an .h5 model, 'tflite' a quantized model from models/quantization.py
+MODEL_FORMAT = os.environ.get('VULCNN_MODEL_FORMAT', 'keras')
+TFLITE_NUM_THREADS = int(os.environ['TFLITE_NUM_THREADS']) if os.environ.get('TFLITE_NUM_THREADS') else None
+
+# TensorFlow thread pools (TensorFlow defaults if unset): intra-op threads
+# parallelize a single op, inter-op threads run independent ops concurrently
+TF_INTRA_OP_THREADS = int(os.environ.get('TF_INTRA_OP_THREADS', 0))
+TF_INTER_OP_THREADS = int(os.environ.get('TF_INTER_OP_THREADS', 0))
+
+# Serve the ten convolution branches as one fused convolution (models/fused.py)
+FUSED_CONV = os.environ.get('VULCNN_FUSED_CONV', 'false').lower() == 'true'
+
+def configure_threading(intra_op_threads=TF_INTRA_OP_THREADS, inter_op_threads=TF_INTER_OP_THREADS):
+    """
+    Size TensorFlow's thread pools
+    
+    Must run before TensorFlow executes its first op; later calls are ignored.
+    
+    Args:
+        intra_op_threads (int): Threads per op (0 keeps the TensorFlow default)
+        inter_op_threads (int): Concurrently running ops (0 keeps the TensorFlow default)
+    """
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        print(f"TensorFlow threading already initialized, keeping current settings: {str(e)}")
+
 def load_model(model_path):
     """
     Load a pre-trained VulCNN model
@@ -55,7 +89,8 @@ def create_vulcnn_model(input_shape, hidden_size=128):
             kernel_size=(filter_size, hidden_size),
             activation='relu'
         )(inputs)
-        conv = keras.layers.Squeeze(axis=3)(conv)
+        # Drop the width axis, which the full-width kernel reduces to 1 (Keras has no Squeeze layer)
+        conv = keras.layers.Reshape(conv.shape[1:3])(conv)
         conv = keras.layers.MaxPool1D(pool_size=conv.shape[1])(conv)
         conv = keras.layers.Flatten()(conv)
         conv_layers.append(conv)
@@ -77,4 +112,113 @@ def create_vulcnn_model(input_shape, hidden_size=128):
         metrics=['accuracy']
     )
     
-    return model
\ No newline at end of file
+    return model
+
+def build_inference_function(model):
+    """
+    Wrap a model in a tf.function with a fixed (batch, 3, max_len, hidden_size) signature
+    
+    Unlike model.predict, calling the function does not build a tf.data
+    pipeline per call, and the fixed signature means it is traced only once.
+    
+    Args:
+        model (keras.Model): Loaded VulCNN model
+        
+    Returns:
+        tf.types.experimental.ConcreteFunction: Function mapping images to class probabilities
+    """
+    input_spec = tf.TensorSpec(shape=(None,) + tuple(model.input_shape[1:]), dtype=tf.float32)
+    
+    @tf.function(input_signature=[input_spec])
+    def serve(images):
+        return model(images, training=False)
+    
+    return serve.get_concrete_function()
+
+class CompiledModel:
+    """
+    VulCNN model served through a compiled inference function
+    
+    Exposes the parts of the Keras model interface the predictor uses
+    (input_shape and predict), so it can be used in place of the model.
+    """
+    
+    def __init__(self, model):
+        """
+        Args:
+            model (keras.Model): Loaded VulCNN model
+        """
+        self.model = model
+        self.input_shape = model.input_shape
+        self.inference_fn = build_inference_function(model)
+    
+    def predict(self, images, verbose=0):
+        """
+        Run inference on a batch of preprocessed images
+        
+        Args:
+            images (numpy.ndarray): (batch, 3, max_len, hidden_size) array
+            
+        Returns:
+            numpy.ndarray: (batch, 2) class probabilities
+        """
+        return self.inference_fn(tf.convert_to_tensor(images, dtype=tf.float32)).numpy()
+    
+    def warmup(self, batch_sizes=(1,)):
+        """Run dummy batches so the first real requests do not pay for kernel setup"""
+        for batch_size in batch_sizes:
+            self.predict(np.zeros((batch_size,) + tuple(self.input_shape[1:]), dtype=np.float32))
+
+def export_saved_model(model, export_dir):
+    """
+    Export a model as a SavedModel with the fixed inference signature
+    
+    Args:
+        model (keras.Model): Loaded VulCNN model
+        export_dir (str): Output directory
+    """
+    tf.saved_model.save(model, export_dir, signatures={'serving_default': build_inference_function(model)})
+
+def load_inference_model(model_path, warmup_batch_sizes=(1,)):
+    """
+    Load a VulCNN model ready for serving
+    
+    Args:
+        model_path (str): Path to the model file (.h5, or .tflite if VULCNN_MODEL_FORMAT is tflite)
+        warmup_batch_sizes (tuple): Batch sizes to warm the model up with
+        
+    Returns:
+        Model with input_shape and predict, or None if loading failed
+    """
+    if MODEL_FORMAT == 'tflite':
+        from models.quantization import load_tflite_model
+        
+        model = load_tflite_model(model_path, TFLITE_NUM_THREADS)
+        if model is not None:
+            model.warmup(warmup_batch_sizes)
+        return model
+    
+    model = load_model(model_path)
+    if model is None:
+        return None
+    
+    if FUSED_CONV:
+        from models.fused import fuse_vulcnn_model
+        
+        try:
+            model = fuse_vulcnn_model(model)
+            print("VulCNN fused convolution model ready")
+        except Exception as e:
+            print(f"Error fusing VulCNN convolution branches, using original model: {str(e)}")
+    
+    if INFERENCE_MODE != 'compiled':
+        return model
+    
+    try:
+        compiled = CompiledModel(model)
+        compiled.warmup(warmup_batch_sizes)
+        print("VulCNN compiled inference function ready")
+        return compiled
+    except Exception as e:
+        print(f"Error compiling VulCNN inference function, using Keras predict: {str(e)}")
+        return model
\ No newline at end of file
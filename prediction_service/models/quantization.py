@@ -0,0 +1,180 @@
+"""
+Post-training quantization of the VulCNN model for CPU inference
+
+Converts the Keras model to TensorFlow Lite with float16 weights, dynamic
+range (int8 weights) or full int8 quantization calibrated on real image
+representations, and provides a loader with the same predict interface as
+the Keras model.
+
+Usage (from prediction_service/):
+    python -m models.quantization --model ../models/vulcnn_model.h5 \
+        --output ../models/vulcnn_model_int8.tflite --mode int8 \
+        --calibration ../data/images/*.pkl
+"""
+import argparse
+import os
+import pickle
+import threading
+import numpy as np
+import tensorflow as tf
+
+QUANTIZATION_MODES = ('float16', 'dynamic', 'int8')
+
+def load_calibration_images(image_paths, max_len=100, hidden_size=128, limit=200):
+    """
+    Preprocess image representation files for int8 calibration
+
+    Args:
+        image_paths (list): Paths to image representation files (.pkl)
+        max_len (int): Model input rows
+        hidden_size (int): Model input embedding size
+        limit (int): Maximum number of images to use
+
+    Returns:
+        numpy.ndarray: (n, 3, max_len, hidden_size) float32 array
+    """
+    from predictor.vulcnn import fill_image
+
+    paths = image_paths[:limit]
+    images = np.zeros((len(paths), 3, max_len, hidden_size), dtype=np.float32)
+    for target, path in zip(images, paths):
+        with open(path, 'rb') as f:
+            fill_image(target, pickle.load(f))
+    return images
+
+def convert_to_tflite(model, output_path, mode='float16', calibration_images=None):
+    """
+    Convert a Keras VulCNN model to a quantized TFLite model
+
+    Inputs and outputs stay float32 in every mode, so the quantized model is
+    a drop-in replacement for the float model.
+
+    Args:
+        model (keras.Model): Loaded VulCNN model
+        output_path (str): Where to save the .tflite file
+        mode (str): 'float16', 'dynamic' (int8 weights) or 'int8' (int8 weights and activations)
+        calibration_images (numpy.ndarray): Preprocessed images, required for 'int8'
+
+    Returns:
+        str: output_path
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'int8':
+        if calibration_images is None or not len(calibration_images):
+            raise ValueError("int8 quantization needs calibration images")
+
+        def representative_dataset():
+            for image in calibration_images:
+                yield [image[None].astype(np.float32)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    tflite_model = converter.convert()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    return output_path
+
+class TFLiteModel:
+    """
+    TFLite VulCNN model with the Keras predict interface
+
+    The interpreter is resized to the batch size of each call. It is not
+    thread-safe, so calls are serialized.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        """
+        Args:
+            model_path (str): Path to the .tflite file
+            num_threads (int): Interpreter CPU threads (TFLite default if None)
+        """
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(int(dim) for dim in self._input['shape'][1:])
+        self._batch_size = int(self._input['shape'][0])
+        self._lock = threading.Lock()
+
+    def predict(self, images, verbose=0):
+        """
+        Run inference on a batch of preprocessed images
+
+        Args:
+            images (numpy.ndarray): (batch, 3, max_len, hidden_size) array
+
+        Returns:
+            numpy.ndarray: (batch, 2) class probabilities
+        """
+        images = np.asarray(images, dtype=np.float32)
+        with self._lock:
+            if len(images) != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input['index'], images.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = len(images)
+            self.interpreter.set_tensor(self._input['index'], images)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+    def warmup(self, batch_sizes=(1,)):
+        for batch_size in batch_sizes:
+            self.predict(np.zeros((batch_size,) + self.input_shape[1:], dtype=np.float32))
+
+def load_tflite_model(model_path, num_threads=None):
+    """
+    Load a TFLite VulCNN model
+
+    Args:
+        model_path (str): Path to the .tflite file
+        num_threads (int): Interpreter CPU threads
+
+    Returns:
+        TFLiteModel: Loaded model or None if failed
+    """
+    try:
+        print(f"Loading TFLite VulCNN model from {model_path}")
+
+        if not os.path.exists(model_path):
+            print(f"Model file not found: {model_path}")
+            return None
+
+        model = TFLiteModel(model_path, num_threads)
+        print("TFLite VulCNN model loaded successfully")
+        return model
+
+    except Exception as e:
+        print(f"Error loading TFLite VulCNN model: {str(e)}")
+        return None
+
+if __name__ == '__main__':
+    from models.model import load_model
+
+    parser = argparse.ArgumentParser(description='Quantize the VulCNN model to TFLite')
+    parser.add_argument('--model', default='../models/vulcnn_model.h5', help='Keras model path')
+    parser.add_argument('--output', required=True, help='Where to save the .tflite model')
+    parser.add_argument('--mode', choices=QUANTIZATION_MODES, default='float16')
+    parser.add_argument('--calibration', nargs='*', default=[], help='Image files (.pkl) for int8 calibration')
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    args = parser.parse_args()
+
+    keras_model = load_model(args.model)
+    if keras_model is None:
+        raise SystemExit('VulCNN model could not be loaded')
+
+    calibration = None
+    if args.mode == 'int8':
+        _, _, max_len, hidden_size = keras_model.input_shape
+        calibration = load_calibration_images(args.calibration, max_len, hidden_size, args.calibration_samples)
+
+    convert_to_tflite(keras_model, args.output, args.mode, calibration)
+    print(f"Saved {args.mode} model to {args.output} ({os.path.getsize(args.output) / 1024:.0f} KiB)")
@@ -0,0 +1,236 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from models.loader import BackgroundModelLoader
+
+MODEL_ROLES = ('active', 'shadow')
+
+class ModelRegistry:
+    """
+    Loaded model versions of the prediction service
+
+    New versions load in the background while the active one keeps
+    serving; once loaded, the active reference is swapped in a single
+    assignment, so batches already running finish on the old model and
+    no request is dropped. The previously active version is kept for
+    rollback. A shadow version can run on a sampled fraction of batches,
+    off the request path, to compare its latency and predictions with the
+    active model before promoting it.
+    """
+
+    def __init__(self, load_fn, version_fn, name='model', shadow_sample_rate=0.0, max_shadow_pending=4):
+        """
+        Args:
+            load_fn: Function taking a model path and returning the model (None on failure)
+            version_fn: Function taking a model path and returning its version identifier
+            name (str): Model name used in log messages
+            shadow_sample_rate (float): Fraction of batches also run on the shadow model
+            max_shadow_pending (int): Shadow batches allowed to queue before samples are skipped
+        """
+        self.load_fn = load_fn
+        self.version_fn = version_fn
+        self.name = name
+        self.shadow_sample_rate = shadow_sample_rate
+        self.max_shadow_pending = max_shadow_pending
+        self._versions = {}
+        self._active = None
+        self._previous = None
+        self._shadow = None
+        self._loading = []
+        self._last_failed = None
+        self._lock = threading.Lock()
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-shadow")
+        self._shadow_pending = 0
+        self._shadow_stats = {
+            'batches': 0, 'rows': 0, 'seconds': 0.0, 'disagreements': 0,
+            'max_abs_difference': 0.0, 'skipped': 0, 'errors': 0
+        }
+
+    def load(self, model_path, role='active'):
+        """
+        Start loading a model version in the background
+
+        Args:
+            model_path (str): Path passed to load_fn
+            role (str): 'active' to swap it in once loaded, 'shadow' to shadow the active model
+
+        Returns:
+            BackgroundModelLoader: Loader of the new version
+        """
+        if role not in MODEL_ROLES:
+            raise ValueError(f"Role must be one of {', '.join(MODEL_ROLES)}")
+
+        loader = BackgroundModelLoader(
+            self.load_fn, model_path, name=f"{self.name} ({role})",
+            on_load=lambda loaded: self._install(loaded, role)
+        )
+        loader.role = role
+        loader.version = None
+        with self._lock:
+            self._loading.append(loader)
+        loader.start()
+        threading.Thread(target=self._track, args=(loader,), daemon=True).start()
+        return loader
+
+    def _install(self, loader, role):
+        # Runs in the loader thread before waiting requests are released
+        loader.version = self.version_fn(loader.model_path)
+        with self._lock:
+            self._versions[loader.version] = loader
+            if role == 'active':
+                self._swap(loader.version)
+            else:
+                self._shadow = loader.version
+        print(f"{self.name} version {loader.version} is now {role}")
+
+    def _track(self, loader):
+        loader.wait()
+        with self._lock:
+            self._loading.remove(loader)
+            if not loader.is_ready:
+                self._last_failed = loader.status()
+
+    def _swap(self, version):
+        """Make a loaded version active (caller holds the lock)"""
+        if version != self._active:
+            self._previous = self._active
+            self._active = version
+        if self._shadow == version:
+            self._shadow = None
+        # Keep only what can still serve: active, shadow and the rollback target
+        keep = {self._active, self._previous, self._shadow}
+        for stale in [v for v in self._versions if v not in keep]:
+            del self._versions[stale]
+
+    def activate(self, version):
+        """
+        Swap an already loaded version in (promote the shadow, or roll back)
+
+        Raises:
+            KeyError: If the version is not loaded
+        """
+        with self._lock:
+            if version not in self._versions:
+                raise KeyError(version)
+            self._swap(version)
+
+    def clear_shadow(self):
+        """Stop shadowing and unload the shadow version"""
+        with self._lock:
+            version, self._shadow = self._shadow, None
+            if version is not None and version not in (self._active, self._previous):
+                self._versions.pop(version, None)
+
+    @property
+    def active_version(self):
+        return self._active
+
+    @property
+    def model(self):
+        """The active model, or None if no version is loaded yet"""
+        loader = self._versions.get(self._active)
+        return loader.model if loader is not None else None
+
+    @property
+    def is_ready(self):
+        return self._active is not None
+
+    @property
+    def state(self):
+        if self.is_ready:
+            return 'ready'
+        with self._lock:
+            loading = [loader for loader in self._loading if loader.role == 'active']
+        return loading[-1].state if loading else 'failed'
+
+    def wait(self, timeout=None):
+        """
+        Wait for a first active version if none is loaded yet
+
+        Args:
+            timeout (float): Maximum seconds to wait
+
+        Returns:
+            The active model, or None if loading failed or timed out
+        """
+        if not self.is_ready:
+            with self._lock:
+                loading = [loader for loader in self._loading if loader.role == 'active']
+            if loading:
+                loading[-1].wait(timeout)
+        return self.model
+
+    def shadow(self, batch, outputs):
+        """
+        Run a sampled batch on the shadow model in the background
+
+        Args:
+            batch (numpy.ndarray): Model input the active model was run on
+            outputs (numpy.ndarray): Active model output for the batch
+        """
+        shadow = self._versions.get(self._shadow) if self._shadow is not None else None
+        if shadow is None or random.random() >= self.shadow_sample_rate:
+            return
+
+        with self._lock:
+            if self._shadow_pending >= self.max_shadow_pending:
+                self._shadow_stats['skipped'] += 1
+                return
+            self._shadow_pending += 1
+        # The caller may reuse its input buffer once this returns
+        self._shadow_executor.submit(self._run_shadow, shadow.model, np.array(batch), np.array(outputs))
+
+    def _run_shadow(self, model, batch, outputs):
+        try:
+            start = time.perf_counter()
+            shadow_outputs = model.predict(batch, verbose=0)
+            elapsed = time.perf_counter() - start
+            disagreements = int(np.sum(np.argmax(shadow_outputs, axis=1) != np.argmax(outputs, axis=1)))
+            difference = float(np.max(np.abs(shadow_outputs - outputs)))
+            with self._lock:
+                self._shadow_stats['batches'] += 1
+                self._shadow_stats['rows'] += len(batch)
+                self._shadow_stats['seconds'] += elapsed
+                self._shadow_stats['disagreements'] += disagreements
+                self._shadow_stats['max_abs_difference'] = max(self._shadow_stats['max_abs_difference'], difference)
+        except Exception as e:
+            print(f"Error running {self.name} shadow model: {str(e)}")
+            with self._lock:
+                self._shadow_stats['errors'] += 1
+        finally:
+            with self._lock:
+                self._shadow_pending -= 1
+
+    def _describe(self, version):
+        loader = self._versions.get(version) if version is not None else None
+        if loader is None:
+            return None
+        return dict(loader.status(), version=version)
+
+    def status(self):
+        """
+        Registry state: active, previous and shadow versions, loads in progress and shadow metrics
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            shadow_stats = dict(self._shadow_stats)
+            status = {
+                'name': self.name,
+                'state': 'ready' if self._active is not None else 'loading' if self._loading else 'failed',
+                'active': self._describe(self._active),
+                'previous': self._describe(self._previous),
+                'shadow': self._describe(self._shadow),
+                'loading': [dict(loader.status(), role=loader.role) for loader in self._loading],
+                'last_failed': self._last_failed
+            }
+        rows = shadow_stats['rows']
+        shadow_stats['mean_ms_per_row'] = shadow_stats['seconds'] * 1000 / rows if rows else 0.0
+        shadow_stats['disagreement_rate'] = shadow_stats['disagreements'] / rows if rows else 0.0
+        shadow_stats['sample_rate'] = self.shadow_sample_rate
+        status['shadow_metrics'] = shadow_stats
+        return status
@@ -0,0 +1,174 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import numpy as np
+
+class QueueFullError(Exception):
+    """Raised when a submission arrives while the batcher queue is full"""
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching for model inference
+
+    Requests submit preprocessed images and wait on a future. A worker thread
+    collects submissions for up to max_latency_ms (or until max_batch_size
+    rows are queued), runs one forward pass over the stacked batch and hands
+    each request its own rows of the output.
+
+    With num_workers > 1 several batches run at once, which only helps if
+    the model's intra-op thread pool is sized so they do not contend for
+    the same cores. The queue is bounded: once max_queue_size submissions
+    are waiting, new ones are rejected instead of piling up.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_latency_ms=5.0, max_queue_size=0, num_workers=1):
+        """
+        Args:
+            predict_fn: Function mapping a (batch, ...) array to a (batch, ...) array of outputs
+            max_batch_size (int): Maximum number of rows per forward pass
+            max_latency_ms (float): Maximum time the first request of a batch waits for others
+            max_queue_size (int): Maximum number of waiting submissions (0 for unbounded)
+            num_workers (int): Number of batches run concurrently
+        """
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.num_workers = num_workers
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0, 'rows': 0, 'batches': 0, 'compute_seconds': 0.0,
+            'queue_wait_seconds': 0.0, 'rejected': 0
+        }
+        # Recent per-request timings for percentiles
+        self._queue_waits = deque(maxlen=1000)
+        self._computes = deque(maxlen=1000)
+
+    def start(self):
+        """Start the batching worker threads (no-op if already running)"""
+        with self._lock:
+            if not self._threads:
+                for i in range(self.num_workers):
+                    thread = threading.Thread(target=self._run, name=f'micro-batcher-{i}', daemon=True)
+                    thread.start()
+                    self._threads.append(thread)
+
+    def submit(self, images):
+        """
+        Queue images for the next batch
+
+        A single submission is run as-is, without a copy, so the caller must
+        not modify images afterwards, even if it stops waiting on the future.
+
+        Args:
+            images (numpy.ndarray): (rows, ...) array of preprocessed images
+
+        Returns:
+            concurrent.futures.Future: Resolves to the (rows, ...) model output
+
+        Raises:
+            QueueFullError: If max_queue_size submissions are already waiting
+        """
+        future = Future()
+        try:
+            self._queue.put_nowait((images, future, time.perf_counter()))
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise QueueFullError(f"Inference queue is full ({self.max_queue_size} waiting requests)")
+        return future
+
+    def predict(self, images, timeout=None):
+        """Submit images and wait for their model output"""
+        future = self.submit(images)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Drop the work if it has not been picked up yet
+            future.cancel()
+            raise
+
+    def _collect(self):
+        """Block for the first submission, then gather more until the batch is full or the deadline passes"""
+        items = [self._queue.get()]
+        rows = len(items[0][0])
+        deadline = time.perf_counter() + self.max_latency
+        while rows < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            # Skip requests whose caller already gave up
+            items = [item for item in items if item[1].set_running_or_notify_cancel()]
+            if not items:
+                continue
+
+            start = time.perf_counter()
+            try:
+                batch = items[0][0] if len(items) == 1 else np.concatenate([item[0] for item in items])
+                outputs = self.predict_fn(batch)
+            except Exception as e:
+                for _, future, _ in items:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - start
+
+            offset = 0
+            queue_waits = []
+            for images, future, submitted in items:
+                queue_waits.append(start - submitted)
+                future.set_result(outputs[offset:offset + len(images)])
+                offset += len(images)
+
+            with self._lock:
+                self._stats['requests'] += len(items)
+                self._stats['rows'] += offset
+                self._stats['batches'] += 1
+                self._stats['compute_seconds'] += elapsed
+                self._stats['queue_wait_seconds'] += sum(queue_waits)
+                self._queue_waits.extend(queue_waits)
+                self._computes.extend([elapsed] * len(items))
+
+    def stats(self):
+        """
+        Batching counters since start
+
+        Returns:
+            dict: Request, row and batch counts, average batch size, per-request
+                  queue wait and compute time, and configuration
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            queue_waits = list(self._queue_waits)
+            computes = list(self._computes)
+        stats['avg_batch_rows'] = stats['rows'] / stats['batches'] if stats['batches'] else 0.0
+        stats['avg_queue_wait_ms'] = stats['queue_wait_seconds'] * 1000 / stats['requests'] if stats['requests'] else 0.0
+        for name, values in (('queue_wait', queue_waits), ('compute', computes)):
+            stats[f'{name}_p50_ms'] = _percentile(values, 0.5) * 1000
+            stats[f'{name}_p95_ms'] = _percentile(values, 0.95) * 1000
+        stats['queued'] = self._queue.qsize()
+        stats['max_queue_size'] = self.max_queue_size
+        stats['num_workers'] = self.num_workers
+        stats['max_batch_size'] = self.max_batch_size
+        stats['max_latency_ms'] = self.max_latency * 1000.0
+        return stats
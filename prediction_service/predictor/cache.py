@@ -0,0 +1,140 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+def model_version(model_path):
+    """
+    Version identifier of a model file (sha256 of its contents)
+
+    Args:
+        model_path (str): Path to the model file
+
+    Returns:
+        str: Hex digest, or None if the file does not exist
+    """
+    if not os.path.isfile(model_path):
+        return None
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class PredictionCache:
+    """
+    Cache of model outputs keyed by preprocessed image tensor and model version
+
+    The same normalized function produces the same PDG and image tensor on
+    every scan, so its probabilities can be reused instead of running the
+    model again. Entries live in a bounded in-memory LRU and, if cache_dir
+    is set, in .npy files that survive restarts and are shared between
+    workers.
+    """
+
+    def __init__(self, max_entries=10000, cache_dir=None):
+        """
+        Args:
+            max_entries (int): Maximum number of entries kept in memory
+            cache_dir (str): Optional directory for on-disk entries
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image, version):
+        """
+        Cache key of one preprocessed image
+
+        Args:
+            image (numpy.ndarray): (3, max_len, hidden_size) model input
+            version (str): Model version
+
+        Returns:
+            str: Hex digest over the version, shape, dtype and tensor bytes
+        """
+        image = np.ascontiguousarray(image)
+        digest = hashlib.sha256(str(version).encode())
+        digest.update(f"{image.shape}{image.dtype.str}".encode())
+        digest.update(image.data)
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def get(self, key):
+        """
+        Look an entry up in memory, then on disk
+
+        Returns:
+            numpy.ndarray: Cached model output, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return value
+
+        if self.cache_dir:
+            try:
+                value = np.load(self._disk_path(key), allow_pickle=False)
+            except (OSError, ValueError):
+                value = None
+            if value is not None:
+                self._remember(key, value)
+                with self._lock:
+                    self._stats['hits'] += 1
+                    self._stats['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def put(self, key, value):
+        """Store a model output in memory and, if enabled, on disk"""
+        value = np.array(value)
+        self._remember(key, value)
+
+        if self.cache_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Write then rename so concurrent readers never see a partial file
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    np.save(f, value, allow_pickle=False)
+                os.replace(temp_path, path)
+            except OSError as e:
+                print(f"Error writing prediction cache entry {key}: {str(e)}")
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        """
+        Cache counters since start
+
+        Returns:
+            dict: Hits, misses, hit ratio and size
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['max_entries'] = self.max_entries
+        stats['cache_dir'] = self.cache_dir
+        return stats
@@ -1,5 +1,56 @@
+import threading
 import numpy as np
 
+_thread_buffers = threading.local()
+
+class WindowLimitError(ValueError):
+    """An image or request needs more windows than allowed"""
+
+def get_row_info(image_data):
+    """
+    Source location of each image row, if the image generator recorded it
+    
+    Args:
+        image_data: Tuple of (degree_channel, closeness_channel, katz_channel[, row_info])
+        
+    Returns:
+        list: {'function', 'line'} dict per row, or None for images without row info
+    """
+    if len(image_data) > 3 and image_data[3] and len(image_data[3]) == len(image_data[0]):
+        return image_data[3]
+    return None
+
+def fill_image(target, image_data):
+    """
+    Copy an image representation into a (3, max_len, hidden_size) array
+    
+    Rows beyond max_len are dropped and missing rows are zero-filled.
+    
+    Args:
+        target (numpy.ndarray): Destination array, overwritten entirely
+        image_data: Tuple of (degree_channel, closeness_channel, katz_channel)
+    """
+    max_len = target.shape[1]
+    channels = [channel[:max_len] for channel in image_data[:3]]
+    try:
+        # All channels have one row per PDG line, so they stack in one operation
+        stacked = np.asarray(channels, dtype=target.dtype)
+    except ValueError:
+        stacked = None
+    
+    if stacked is not None and stacked.ndim == 3:
+        rows = stacked.shape[1]
+        target[:, :rows] = stacked
+        target[:, rows:] = 0
+        return
+    
+    # Channels of different lengths
+    for j, channel in enumerate(channels):
+        rows = len(channel)
+        if rows:
+            target[j, :rows] = np.asarray(channel, dtype=target.dtype)
+        target[j, rows:] = 0
+
 class VulCNN:
     """
     VulCNN vulnerability predictor
@@ -16,32 +67,235 @@ class VulCNN:
             model: Trained VulCNN model
         """
         self.model = model
+        
+        # Image size expected by the model, e.g. a smaller hidden size when
+        # it was trained on PCA-projected embeddings
+        self.max_len = 100
+        self.hidden_size = 128
+        input_shape = getattr(model, 'input_shape', None)
+        if input_shape and len(input_shape) == 4:
+            self.max_len = input_shape[2]
+            self.hidden_size = input_shape[3]
     
-    def preprocess_image(self, image_data, max_len=100, hidden_size=128):
+    def preprocess_image(self, image_data, max_len=None, hidden_size=None):
         """
         Preprocess image data for input to the model
         
         Args:
-            image_data: Tuple of (degree_channel, closeness_channel, katz_channel)
-            max_len: Maximum sequence length
-            hidden_size: Size of embedding vectors
+            image_data: Tuple of (degree_channel, closeness_channel, katz_channel[, row_info])
+            max_len: Maximum sequence length (defaults to the model's input size)
+            hidden_size: Size of embedding vectors (defaults to the model's input size)
+            
+        Returns:
+            numpy.ndarray: Preprocessed image representation, shape (1, 3, max_len, hidden_size)
+        """
+        max_len = max_len or self.max_len
+        hidden_size = hidden_size or self.hidden_size
+        out = np.empty((1, 3, max_len, hidden_size), dtype=np.float32)
+        fill_image(out[0], image_data)
+        return out
+    
+    def preprocess_batch(self, images, out=None):
+        """
+        Preprocess several images into one float32 batch
+        
+        Args:
+            images: List of (degree_channel, closeness_channel, katz_channel) tuples
+            out: Optional preallocated (rows, 3, max_len, hidden_size) float32 array
+                 with rows >= len(images), e.g. from input_buffer
+            
+        Returns:
+            numpy.ndarray: (len(images), 3, max_len, hidden_size) array (a view of out if given)
+        """
+        if out is None:
+            out = np.empty((len(images), 3, self.max_len, self.hidden_size), dtype=np.float32)
+        batch = out[:len(images)]
+        for target, image_data in zip(batch, images):
+            fill_image(target, image_data)
+        return batch
+    
+    def input_buffer(self, rows):
+        """
+        Per-thread preallocated input buffer for preprocess_batch
+        
+        The buffer is reused by the next call from the same thread, so its
+        contents must be consumed (or copied) before preprocessing again.
+        Do not submit it to MicroBatcher: a request that times out returns
+        while the batcher may still read the array.
+        
+        Args:
+            rows (int): Minimum number of images the buffer must hold
+            
+        Returns:
+            numpy.ndarray: float32 array of shape (>= rows, 3, max_len, hidden_size)
+        """
+        shape = (3, self.max_len, self.hidden_size)
+        buffer = getattr(_thread_buffers, 'buffer', None)
+        if buffer is None or buffer.shape[1:] != shape or len(buffer) < rows:
+            buffer = np.empty((max(rows, 1),) + shape, dtype=np.float32)
+            _thread_buffers.buffer = buffer
+        return buffer
+    
+    def plan_windows(self, image_data, mode='window', stride=None):
+        """
+        Split an image into max_len-row windows for windowed prediction
+        
+        Args:
+            image_data: Tuple of (degree_channel, closeness_channel, katz_channel[, row_info])
+            mode: 'window' slides over the whole image, 'function' slides over
+                  the rows of each function separately (needs row_info)
+            stride: Rows between window starts (defaults to max_len // 2)
             
         Returns:
-            numpy.ndarray: Preprocessed image representation
+            list: Arrays of the image row indices in each window
         """
-        # Unpack channels
-        degree_channel, closeness_channel, katz_channel = image_data
+        stride = max(1, stride or self.max_len // 2)
+        num_rows = len(image_data[0])
+        row_info = get_row_info(image_data)
         
-        # Initialize empty array
-        vectors = np.zeros(shape=(3, max_len, hidden_size))
+        if mode == 'function' and row_info:
+            groups = {}
+            for row, info in enumerate(row_info):
+                groups.setdefault(info.get('function') or 'Unknown', []).append(row)
+            row_groups = [np.array(rows) for rows in groups.values()]
+        else:
+            row_groups = [np.arange(num_rows)]
         
-        # Fill channels
-        for j, channel in enumerate([degree_channel, closeness_channel, katz_channel]):
-            for i in range(min(len(channel), max_len)):
-                vectors[j][i] = channel[i]
+        windows = []
+        for rows in row_groups:
+            last_start = max(len(rows) - self.max_len, 0)
+            starts = list(range(0, last_start + 1, stride))
+            if starts[-1] != last_start:
+                starts.append(last_start)
+            windows.extend(rows[start:start + self.max_len] for start in starts)
+        return windows
+    
+    def window_images(self, image_data, windows):
+        """Cut the windows returned by plan_windows out of an image"""
+        channels = [np.asarray(channel) for channel in image_data[:3]]
+        return [tuple(channel[rows] for channel in channels) for rows in windows]
+    
+    def aggregate_windows(self, image_data, windows, probabilities):
+        """
+        Turn window predictions into per-function results
+        
+        Each function gets the verdict of its highest-scoring window, with the
+        lines of its rows inside that window as the location. A window's score
+        is shared by every function with rows in it, so with windows from
+        'window' mode a small function next to a vulnerable one is reported
+        as vulnerable too; only 'function' mode windows, which never span
+        functions, attribute scores to a single function.
+        
+        Args:
+            image_data: Image the windows were cut from
+            windows: Row index arrays from plan_windows
+            probabilities: Model output, one row per window
+            
+        Returns:
+            list: Prediction results (see interpret) with function_name,
+                  line_number and line_range added
+        """
+        row_info = get_row_info(image_data)
+        best = {}
+        for rows, row_probabilities in zip(windows, probabilities):
+            functions = {}
+            for row in rows:
+                info = row_info[row] if row_info else {}
+                functions.setdefault(info.get('function') or 'Unknown', []).append(info.get('line', -1))
+            for function, lines in functions.items():
+                if function not in best or row_probabilities[1] > best[function][0][1]:
+                    best[function] = (row_probabilities, lines)
         
-        # Add batch dimension
-        return np.expand_dims(vectors, axis=0)
+        results = []
+        for function, (row_probabilities, lines) in best.items():
+            result = self.interpret(row_probabilities)
+            known_lines = [int(line) for line in lines if line is not None and int(line) >= 0]
+            result['function_name'] = function
+            result['line_number'] = min(known_lines) if known_lines else 0
+            result['line_range'] = [min(known_lines), max(known_lines)] if known_lines else None
+            results.append(result)
+        return results
+    
+    def predict_images(self, images, predict_fn=None, mode='prefix', stride=None,
+                       max_windows=None, max_total_windows=None):
+        """
+        Predict several images in one forward pass
+        
+        In prefix mode each image is one model input. In window and function
+        mode each image's windows are, and its results come from
+        aggregate_windows. Images are preprocessed one by one, so a malformed
+        image fails on its own; the inputs of the others go through the
+        model in one forward pass.
+        
+        The window limits bound the memory of that forward pass: an image
+        with more than max_windows windows fails on its own, and more than
+        max_total_windows windows in all fail the whole call before
+        anything is preprocessed.
+        
+        Args:
+            images: List of (degree_channel, closeness_channel, katz_channel[, row_info]) tuples
+            predict_fn: Function running the model on a batch (defaults to model.predict)
+            mode: 'prefix', 'window' or 'function', see plan_windows
+            stride: Rows between window starts
+            max_windows: Maximum windows of one image (None for no limit)
+            max_total_windows: Maximum windows of all images (None for no limit)
+            
+        Returns:
+            list: For each image, a list of prediction results (one per function
+                  in window/function mode, a single one in prefix mode), or
+                  the exception raised preprocessing it
+            
+        Raises:
+            WindowLimitError: If the images need more than max_total_windows windows
+        """
+        predict_fn = predict_fn or self.model.predict
+        plans = []
+        for image_data in images:
+            try:
+                if mode == 'prefix':
+                    plans.append(None)
+                    continue
+                windows = self.plan_windows(image_data, mode, stride)
+                if max_windows and len(windows) > max_windows:
+                    raise WindowLimitError(f"Image needs {len(windows)} windows, the limit is {max_windows}")
+                plans.append(windows)
+            except Exception as e:
+                plans.append(e)
+        
+        total_windows = sum(len(windows) for windows in plans if isinstance(windows, list))
+        if max_total_windows and total_windows > max_total_windows:
+            raise WindowLimitError(f"Request needs {total_windows} windows, the limit is {max_total_windows}")
+        
+        prepared = []
+        for image_data, windows in zip(images, plans):
+            if isinstance(windows, Exception):
+                prepared.append(windows)
+                continue
+            try:
+                if windows is None:
+                    prepared.append((None, self.preprocess_batch([image_data])))
+                else:
+                    prepared.append((windows, self.preprocess_batch(self.window_images(image_data, windows))))
+            except Exception as e:
+                prepared.append(e)
+        
+        batches = [item[1] for item in prepared if not isinstance(item, Exception)]
+        probabilities = predict_fn(np.concatenate(batches)) if batches else None
+        
+        results = []
+        offset = 0
+        for image_data, item in zip(images, prepared):
+            if isinstance(item, Exception):
+                results.append(item)
+                continue
+            windows, batch = item
+            rows = probabilities[offset:offset + len(batch)]
+            offset += len(batch)
+            if windows is None:
+                results.append([self.interpret(rows[0])])
+            else:
+                results.append(self.aggregate_windows(image_data, windows, rows))
+        return results
     
     def predict(self, image_data):
         """
@@ -62,9 +316,21 @@ class VulCNN:
         # Make prediction
         prediction = self.model.predict(processed_image)
         
+        return self.interpret(prediction[0])
+    
+    def interpret(self, probabilities):
+        """
+        Turn the model output for one image into a prediction result
+        
+        Args:
+            probabilities: Model output row (prob_not_vulnerable, prob_vulnerable)
+            
+        Returns:
+            dict: Prediction result
+        """
         # Get class probabilities
-        prob_not_vulnerable = prediction[0][0]
-        prob_vulnerable = prediction[0][1]
+        prob_not_vulnerable = probabilities[0]
+        prob_vulnerable = probabilities[1]
         
         # Determine if vulnerable
         is_vulnerable = prob_vulnerable > 0.5
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+keras = pytest.importorskip('tensorflow').keras
+
+from models.fused import fuse_vulcnn_model
+from models.model import create_vulcnn_model
+
+@pytest.fixture
+def channels_first():
+    # create_vulcnn_model's branches only build on channels_first images
+    previous = keras.backend.image_data_format()
+    keras.backend.set_image_data_format('channels_first')
+    yield
+    keras.backend.set_image_data_format(previous)
+
+def random_vulcnn_model(rng, input_shape=(3, 100, 128)):
+    model = create_vulcnn_model(input_shape, hidden_size=input_shape[2])
+    for layer in model.layers:
+        weights = layer.get_weights()
+        if weights:
+            layer.set_weights([0.05 * rng.standard_normal(w.shape).astype(np.float32) for w in weights])
+    return model
+
+def test_fused_model_matches_original(channels_first):
+    rng = np.random.default_rng(0)
+    model = random_vulcnn_model(rng)
+    fused = fuse_vulcnn_model(model)
+
+    # Non-negative inputs with trailing zero rows, like real images
+    images = np.abs(rng.standard_normal((8,) + model.input_shape[1:])).astype(np.float32)
+    images[:, :, 50:] = 0
+
+    np.testing.assert_allclose(fused.predict(images, verbose=0), model.predict(images, verbose=0), atol=1e-5)
+
+def test_fused_model_keeps_feature_count(channels_first):
+    model = random_vulcnn_model(np.random.default_rng(1))
+    fused = fuse_vulcnn_model(model)
+
+    # One feature per output row of each branch: sum of 101 - h for h = 1..10
+    assert fused.layers[-1].get_weights()[0].shape == (955, 2)
+
+def test_fuse_rejects_mismatched_output_layer(channels_first):
+    model = random_vulcnn_model(np.random.default_rng(2))
+    inputs = keras.layers.Input(shape=model.input_shape[1:])
+    features = keras.layers.Flatten()(model.layers[1](inputs))
+    broken = keras.Model(inputs, keras.layers.Dense(2, activation='softmax')(features))
+
+    with pytest.raises(ValueError, match='features'):
+        fuse_vulcnn_model(broken)